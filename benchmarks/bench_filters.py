@@ -0,0 +1,82 @@
+# benchmarks/bench_filters.py
+#
+# Compares the vectorized filters in services.image_filters with the per-pixel
+# implementations they replaced.
+#
+#   python benchmarks/bench_filters.py --megapixels 12
+#
+# The legacy Sepia loop takes minutes at 12 MP, so it runs on a smaller image
+# (--legacy-megapixels) and its time is scaled up linearly for comparison.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.image_filters import FILTERS, apply_filter  # noqa: E402
+
+
+def legacy_sepia(img):
+    width, height = img.size
+    for x in range(width):
+        for y in range(height):
+            r, g, b = img.getpixel((x, y))[:3]
+            tr = int(0.393 * r + 0.769 * g + 0.189 * b)
+            tg = int(0.349 * r + 0.686 * g + 0.168 * b)
+            tb = int(0.272 * r + 0.534 * g + 0.131 * b)
+            img.putpixel((x, y), (min(tr, 255), min(tg, 255), min(tb, 255)))
+    return img
+
+
+def legacy_high_contrast(img):
+    return img.point(lambda x: x * 1.5)
+
+
+def make_image(megapixels: float) -> Image.Image:
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), "RGB")
+
+
+def timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark image filters.")
+    parser.add_argument("--megapixels", type=float, default=12.0)
+    parser.add_argument("--legacy-megapixels", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    img = make_image(args.megapixels)
+    print(f"Image: {img.size[0]}x{img.size[1]} ({args.megapixels:g} MP)")
+    print(f"{'filter':<15}{'time':>10}")
+    for name in FILTERS:
+        seconds = timed(lambda: apply_filter(img, name))
+        print(f"{name:<15}{seconds * 1000:>8.0f}ms")
+
+    small = make_image(args.legacy_megapixels)
+    scale = args.megapixels / args.legacy_megapixels
+    legacy = timed(lambda: legacy_sepia(small.copy()), repeat=1) * scale
+    vectorized = timed(lambda: apply_filter(img, "Sepia"))
+    print(f"\nSepia: legacy per-pixel loop ~{legacy:.1f}s (extrapolated from {args.legacy_megapixels:g} MP), "
+          f"vectorized {vectorized * 1000:.0f}ms, {legacy / vectorized:.0f}x faster")
+
+    legacy = timed(lambda: legacy_high_contrast(img))
+    vectorized = timed(lambda: apply_filter(img, "High Contrast"))
+    print(f"High Contrast: legacy point(lambda) {legacy * 1000:.0f}ms, LUT {vectorized * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_startup.py
+#
+# Tracks startup cost of the app: cold import time of the services package and the
+# time until the Streamlit script finishes its first run (first render). Every sample
+# runs in a fresh interpreter so nothing is already imported. "first render (empty app)"
+# is Streamlit's own startup; the difference to app.py is what the app adds. AppTest's
+# wall clock also includes its own polling, so "app.py script run" times just the
+# script, from inside the script thread.
+#
+#   python benchmarks/bench_startup.py --repeat 5
+#   python benchmarks/bench_startup.py --importtime   # slowest modules behind `import services`
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs app.py inside AppTest and hands the script's own run time back to the test thread.
+SCRIPT_TIMER = (
+    "import os, runpy, sys, time\n"
+    "sys.path.insert(0, os.getcwd())\n"
+    "started = time.perf_counter()\n"
+    "runpy.run_path(os.path.abspath('app.py'), run_name='__main__')\n"
+    "os.environ['BENCH_SCRIPT_SECONDS'] = str(time.perf_counter() - started)\n"
+)
+
+# Each snippet prints the seconds it took; it runs with ROOT as the working directory.
+SCENARIOS = {
+    "import services": (
+        "import time; t = time.perf_counter(); import services; "
+        "print(time.perf_counter() - t)"
+    ),
+    "first service call path": (
+        "import time; t = time.perf_counter(); import services; services.generate_hd_image; "
+        "print(time.perf_counter() - t)"
+    ),
+    "all services": (
+        "import time; t = time.perf_counter(); import services; "
+        "[getattr(services, name) for name in services.__all__]; print(time.perf_counter() - t)"
+    ),
+    "first render (empty app)": (
+        "import time; t = time.perf_counter(); from streamlit.testing.v1 import AppTest; "
+        "at = AppTest.from_string('import streamlit as st', default_timeout=120); at.run(); "
+        "print(time.perf_counter() - t)"
+    ),
+    "first render (app.py)": (
+        "import time; t = time.perf_counter(); from streamlit.testing.v1 import AppTest; "
+        "at = AppTest.from_file('app.py', default_timeout=120); at.run(); "
+        "print(time.perf_counter() - t)"
+    ),
+    "app.py script run": (
+        "import os; from streamlit.testing.v1 import AppTest; "
+        f"AppTest.from_string({SCRIPT_TIMER!r}, default_timeout=120).run(); "
+        "print(os.environ['BENCH_SCRIPT_SECONDS'])"
+    ),
+}
+
+
+def sample(snippet: str):
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"
+    return float(result.stdout.strip().splitlines()[-1]), None
+
+
+def show_importtime(limit: int):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import services"],
+                            cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative / 1000:>8.1f}ms {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cold import and first-render time.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="List the slowest imports behind `import services`")
+    args = parser.parse_args(argv)
+
+    if args.importtime:
+        show_importtime(limit=20)
+        return
+
+    print(f"{'scenario':<26}{'median':>10}{'min':>10}")
+    for name, snippet in SCENARIOS.items():
+        timings = []
+        for _ in range(args.repeat):
+            seconds, error = sample(snippet)
+            if error:
+                print(f"{name:<26}  skipped: {error}")
+                break
+            timings.append(seconds)
+        if timings:
+            print(f"{name:<26}{statistics.median(timings) * 1000:>8.0f}ms{min(timings) * 1000:>8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/compare_reruns.py
+#
+# Before/after comparison of rerun cost per interaction. Record one session with
+# full-page reruns and one with per-tab fragments, doing the same interactions in each
+# (e.g. move the generative-fill brush slider ten times, switch product tools):
+#
+#   AR_STUDIO_FRAGMENTS=0 AR_STUDIO_RERUN_LOG=before.csv streamlit run app.py
+#   AR_STUDIO_FRAGMENTS=1 AR_STUDIO_RERUN_LOG=after.csv  streamlit run app.py
+#   python benchmarks/compare_reruns.py before.csv after.csv
+#
+# With full-page reruns every interaction costs a whole `main` run; with fragments an
+# interaction inside a tab costs only that tab's fragment run.
+
+import argparse
+import csv
+import statistics
+from collections import defaultdict
+
+
+def load(path: str):
+    """
+    Return {(mode, scope): [milliseconds, ...]} from a rerun log.
+
+    Tab runs that happened inside a full script run (the first page load, or any
+    st.rerun()) are left out, so fragment timings only cover fragment reruns.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = [(row["mode"], row["scope"], float(row["timestamp"]), float(row["milliseconds"]))
+                for row in csv.DictReader(f)]
+    # Each row is logged when its run ends; a full run spans [end - duration, end].
+    full_runs = [(end - ms / 1000, end) for _, scope, end, ms in rows if scope == "main"]
+    timings = defaultdict(list)
+    for mode, scope, end, ms in rows:
+        if scope != "main" and any(start <= end <= stop for start, stop in full_runs):
+            continue
+        timings[(mode, scope)].append(ms)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare full-page and fragment rerun times.")
+    parser.add_argument("before", help="Log recorded with AR_STUDIO_FRAGMENTS=0")
+    parser.add_argument("after", help="Log recorded with fragments enabled")
+    args = parser.parse_args(argv)
+
+    before = load(args.before)
+    after = load(args.after)
+    full_runs = before.get(("full", "main"), [])
+    if not full_runs:
+        parser.error(f"{args.before} has no full-page runs; record it with AR_STUDIO_FRAGMENTS=0")
+    full_median = statistics.median(full_runs)
+    print(f"Full-page rerun (before): median {full_median:.0f}ms over {len(full_runs)} runs\n")
+
+    print(f"{'interaction in tab':<36}{'before':>10}{'after':>10}{'speedup':>10}{'runs':>6}")
+    for (mode, scope), runs in sorted(after.items()):
+        if mode != "fragment" or scope == "main":
+            continue
+        fragment_median = statistics.median(runs)
+        tab = scope.replace("render_", "").replace("_tab", "")
+        print(f"{tab:<36}{full_median:>8.0f}ms{fragment_median:>8.0f}ms"
+              f"{full_median / max(fragment_median, 0.01):>9.1f}x{len(runs):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,72 @@
-from .packshot import create_packshot
-from .prompt_ench import enhance_prompt
-from .generative_fill import generative_fill
-from .product_cutout import product_cutout
-from .image_features import generate_background, remove_image_background, blur_background
-from .image_editing import erase_foreground
-from services.hd_image_gen import generate_hd_image
-from .image_expansion import expand_image
-from .product_service import (
-    create_product_packshot,
-    add_product_shadow,
-    create_lifestyle_shot_by_text
-)
-
-__all__ = [
-    'create_packshot',
-    'enhance_prompt',
-    'generate_hd_image',
-    'generative_fill',
-    'product_cutout',
-    'generate_background',
-    'remove_image_background',
-    'blur_background',
-    'erase_foreground',
-    'expand_image',
-    'create_product_packshot',
-    'add_product_shadow',
-    'create_lifestyle_shot_by_text'
-] 
-# services/__init__.py
\ No newline at end of file
+# services/__init__.py
+#
+# Feature modules are imported on first attribute access (PEP 562), so `import services`
+# stays cheap and a page only pays for the services it actually calls.
+
+import importlib
+import sys
+import types
+
+from .settings import get_settings
+
+# Exported name -> submodule that defines it.
+_EXPORTS = {
+    'create_packshot': 'packshot',
+    'enhance_prompt': 'prompt_ench',
+    'enhance_prompt_async': 'prompt_ench',
+    'generative_fill': 'generative_fill',
+    'generative_fill_async': 'generative_fill',
+    'roi_generative_fill': 'roi_fill',
+    'multi_region_fill': 'roi_fill',
+    'product_cutout': 'product_cutout',
+    'product_cutout_async': 'product_cutout',
+    'generate_background': 'image_features',
+    'remove_image_background': 'image_features',
+    'blur_background': 'image_features',
+    'generate_background_async': 'image_features',
+    'remove_image_background_async': 'image_features',
+    'blur_background_async': 'image_features',
+    'erase_foreground': 'image_editing',
+    'erase_foreground_async': 'image_editing',
+    'generate_hd_image': 'hd_image_gen',
+    'generate_hd_image_async': 'hd_image_gen',
+    'expand_image': 'image_expansion',
+    'expand_image_async': 'image_expansion',
+    'create_product_packshot': 'product_service',
+    'add_product_shadow': 'product_service',
+    'create_packshot_colorways': 'packshot_recolor',
+    'create_lifestyle_shot_by_text': 'product_service',
+    'create_product_packshot_async': 'product_service',
+    'add_product_shadow_async': 'product_service',
+    'create_lifestyle_shot_by_text_async': 'product_service',
+}
+
+__all__ = list(_EXPORTS)
+
+# Load .env once, before any submodule reads its configuration from the environment.
+get_settings()
+
+
+class _ServicesModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package; generative_fill and product_cutout
+        # share their name with the function they export, and the function must win.
+        if name in _EXPORTS and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _ServicesModule
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__.
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,444 @@
+# services/asset_store.py
+#
+# Fetch-once store for Bria result assets. Every result URL is downloaded a single time
+# and then served from disk to display, download and save paths alike, across Streamlit
+# reruns. Bria result URLs are pre-signed and expire; the store keys assets by the URL
+# without its signing parameters, so a copy stays usable after the link has expired.
+#
+# Layout: files are named by the SHA-256 of their content and fanned out over two levels
+# of subdirectories (<dir>/ab/cd/abcd....png), so identical results are stored once and
+# no directory grows large. A SQLite index maps URL keys to files and records validators,
+# sizes and access times; a background thread evicts by age and total size. Assets
+# pinned by an owner (e.g. a history entry) are kept until it unpins them.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from calendar import timegm
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from . import http_client
+
+DEFAULT_DIRECTORY = os.getenv("BRIA_ASSET_DIR", "temp_bria_results")
+# Seconds a stored asset is used without asking the origin whether it changed.
+DEFAULT_FRESH_SECONDS = float(os.getenv("BRIA_ASSET_FRESH_SECONDS", "3600"))
+# Eviction limits enforced by the garbage collector.
+DEFAULT_MAX_BYTES = int(float(os.getenv("BRIA_ASSET_MAX_MB", "2048")) * 1024 * 1024)
+DEFAULT_MAX_AGE_SECONDS = float(os.getenv("BRIA_ASSET_MAX_AGE_DAYS", "7")) * 24 * 3600
+DEFAULT_GC_INTERVAL_SECONDS = 300
+
+INDEX_FILE = "index.sqlite3"
+STAGING_DIR = ".staging"
+# Access times are written at most this often per asset, so hits stay read-only.
+TOUCH_INTERVAL_SECONDS = 60
+# Downloads of the same key are serialized on one of this many locks, so the lock table
+# stays fixed-size however many assets pass through.
+KEY_LOCK_STRIPES = 64
+
+# Query parameters that only sign a URL; they change between links to the same object.
+SIGNING_PARAMS = {
+    "x-amz-algorithm", "x-amz-credential", "x-amz-date", "x-amz-expires", "x-amz-signedheaders",
+    "x-amz-signature", "x-amz-security-token", "awsaccesskeyid", "signature", "expires",
+}
+
+EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".webm", ".mp4", ".gif")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    max_age REAL,
+    url_expires_at REAL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_last_access ON assets (last_access);
+CREATE INDEX IF NOT EXISTS assets_content_hash ON assets (content_hash);
+CREATE TABLE IF NOT EXISTS pins (
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    PRIMARY KEY (key, owner)
+);
+CREATE INDEX IF NOT EXISTS pins_owner ON pins (owner);
+"""
+
+
+def asset_key(url: str) -> str:
+    """Stable key of a result URL: the URL with its signing parameters removed, hashed."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SIGNING_PARAMS]
+    stable = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ""))
+    return hashlib.sha256(stable.encode("utf-8")).hexdigest()
+
+
+def url_expires_at(url: str) -> Optional[float]:
+    """Unix time at which a pre-signed URL stops working, or None if it does not say."""
+    params = {k.lower(): v for k, v in parse_qsl(urlsplit(url).query)}
+    try:
+        if "x-amz-date" in params and "x-amz-expires" in params:
+            signed_at = timegm(time.strptime(params["x-amz-date"], "%Y%m%dT%H%M%SZ"))
+            return signed_at + int(params["x-amz-expires"])
+        if "expires" in params:
+            return float(params["expires"])
+    except ValueError:
+        pass
+    return None
+
+
+def _extension_for(url: str) -> str:
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    return ext if ext in EXTENSIONS else ".png"
+
+
+def _max_age(response) -> Optional[float]:
+    for directive in response.headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return float(value)
+    return None
+
+
+def fanout_path(content_hash: str, extension: str) -> str:
+    """Relative path of a content-addressed file: ab/cd/abcd...<ext>."""
+    return os.path.join(content_hash[:2], content_hash[2:4], content_hash + extension)
+
+
+class AssetStore:
+    """
+    Local copies of remote result assets, indexed in SQLite.
+
+    Each URL key maps to one content-addressed file plus its validators (ETag,
+    Last-Modified) and freshness. Concurrent requests for the same URL share one
+    download. collect_garbage() drops assets unused for `max_age_seconds` and then the
+    least recently used ones until the store fits in `max_bytes`; pinned assets are
+    neither evicted nor counted.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, fresh_seconds: float = DEFAULT_FRESH_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.downloads = 0
+        self.revalidations = 0
+        self.hits = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+        self._gc_thread = None
+        self._gc_stop = threading.Event()
+
+        os.makedirs(os.path.join(directory, STAGING_DIR), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, INDEX_FILE), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def _abs(self, relative_path: str) -> str:
+        return os.path.join(self.directory, relative_path)
+
+    def _load_record(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM assets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        if not os.path.isfile(self._abs(record["path"])):
+            with self._lock:
+                self._db.execute("DELETE FROM assets WHERE key = ?", (key,))
+                self._db.commit()
+            return None
+        return record
+
+    def _save_record(self, record: Dict[str, Any]):
+        columns = ", ".join(record)
+        placeholders = ", ".join("?" for _ in record)
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO assets ({columns}) VALUES ({placeholders})",
+                             tuple(record.values()))
+            self._db.commit()
+
+    def _touch(self, record: Dict[str, Any], now: float):
+        if now - record["last_access"] < TOUCH_INTERVAL_SECONDS:
+            return
+        record["last_access"] = now
+        with self._lock:
+            self._db.execute("UPDATE assets SET last_access = ? WHERE key = ?", (now, record["key"]))
+            self._db.commit()
+
+    def _is_fresh(self, record: Dict[str, Any], now: float) -> bool:
+        max_age = record["max_age"] if record.get("max_age") is not None else self.fresh_seconds
+        return now < record["fetched_at"] + max_age
+
+    def _store_body(self, response, extension: str):
+        """Stream a response into the staging area, then move it to its content-hash path."""
+        digest = hashlib.sha256()
+        size = 0
+        staging_path = os.path.join(self.directory, STAGING_DIR, f"{uuid.uuid4().hex}.part")
+        try:
+            with open(staging_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
+            relative_path = fanout_path(content_hash, extension)
+            os.makedirs(os.path.dirname(self._abs(relative_path)), exist_ok=True)
+            # Identical content may already be stored under another URL; replacing it is harmless.
+            os.replace(staging_path, self._abs(relative_path))
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+        return content_hash, relative_path, size
+
+    def _download(self, url: str, key: str, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        headers = {}
+        if record is not None:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        response = http_client.get(url, headers=headers, stream=True)
+        try:
+            if response.status_code == 304 and record is not None:
+                self.revalidations += 1
+                now = time.time()
+                record = dict(record, fetched_at=now, last_access=now)
+                self._save_record(record)
+                return record
+            response.raise_for_status()
+            content_hash, relative_path, size = self._store_body(response, _extension_for(url))
+        finally:
+            response.close()
+
+        self.downloads += 1
+        now = time.time()
+        record = {
+            "key": key,
+            "url": url,
+            "content_hash": content_hash,
+            "path": relative_path,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+            "max_age": _max_age(response),
+            "url_expires_at": url_expires_at(url),
+            "fetched_at": now,
+            "last_access": now,
+        }
+        self._save_record(record)
+        return record
+
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Return the index record of a stored asset, downloading or revalidating it if needed.
+
+        A stale copy is revalidated with a conditional GET while its URL is still valid.
+        Once the URL has expired, or if revalidation fails, the stored copy is served
+        as is. Raises requests exceptions only when there is no local copy at all.
+        """
+        key = asset_key(url)
+        with self._key_lock(key):
+            record = self._load_record(key)
+            now = time.time()
+            if record is not None:
+                if record["url"] != url:
+                    # Same object under a newly signed link: adopt its expiry.
+                    record = dict(record, url=url, url_expires_at=url_expires_at(url))
+                    self._save_record(record)
+                url_expired = record["url_expires_at"] is not None and now >= record["url_expires_at"]
+                if self._is_fresh(record, now) or url_expired:
+                    self.hits += 1
+                    self._touch(record, now)
+                    return record
+                try:
+                    return self._download(url, key, record)
+                except requests.exceptions.RequestException as e:
+                    print(f"[asset_store] Revalidation failed for {url}, serving stored copy: {e}")
+                    self.hits += 1
+                    self._touch(record, now)
+                    return record
+            return self._download(url, key, None)
+
+    def get_path(self, url: str) -> str:
+        """Local path of the asset at `url` (local paths are returned unchanged)."""
+        if os.path.isfile(url):
+            return url
+        return self._abs(self.fetch(url)["path"])
+
+    def get_bytes(self, url: str) -> bytes:
+        """Content of the asset at `url`, read from the local copy."""
+        with open(self.get_path(url), "rb") as f:
+            return f.read()
+
+    def put(self, data: bytes, extension: str = ".png") -> str:
+        """
+        Store locally produced content (e.g. a composited result) under its content hash
+        and return its path. It is indexed like downloaded assets, so the GC manages it.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        relative_path = fanout_path(content_hash, extension)
+        path = self._abs(relative_path)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            staging_path = os.path.join(self.directory, STAGING_DIR, f"{uuid.uuid4().hex}.part")
+            with open(staging_path, "wb") as f:
+                f.write(data)
+            os.replace(staging_path, path)
+        now = time.time()
+        self._save_record({
+            "key": f"local:{content_hash}",
+            "url": f"local:{content_hash}",
+            "content_hash": content_hash,
+            "path": relative_path,
+            "size": len(data),
+            "etag": None,
+            "last_modified": None,
+            "content_type": None,
+            "max_age": None,
+            "url_expires_at": None,
+            "fetched_at": now,
+            "last_access": now,
+        })
+        return path
+
+    def pin(self, location: str, owner: str):
+        """
+        Keep an asset out of garbage collection until `owner` unpins it. `location` is a
+        result URL (pinned by its key, so it is kept once it has been fetched, under any
+        later signed link) or a path returned by put().
+        """
+        if location.startswith(("http://", "https://")):
+            key = asset_key(location)
+        else:
+            key = "local:" + os.path.splitext(os.path.basename(location))[0]
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO pins (key, owner) VALUES (?, ?)", (key, owner))
+            self._db.commit()
+
+    def unpin(self, owner: str):
+        """Release every asset pinned by `owner`; the GC then treats them like any other."""
+        with self._lock:
+            self._db.execute("DELETE FROM pins WHERE owner = ?", (owner,))
+            self._db.commit()
+
+    def _delete_rows(self, rows):
+        """Drop index rows and remove files no other row still references. Caller holds self._lock."""
+        for row in rows:
+            self._db.execute("DELETE FROM assets WHERE key = ?", (row["key"],))
+            still_used = self._db.execute(
+                "SELECT 1 FROM assets WHERE content_hash = ? LIMIT 1", (row["content_hash"],)
+            ).fetchone()
+            if still_used is None:
+                try:
+                    os.remove(self._abs(row["path"]))
+                except FileNotFoundError:
+                    pass
+            self.evictions += 1
+
+    def collect_garbage(self) -> Dict[str, int]:
+        """
+        Evict assets last used more than max_age_seconds ago, then least recently used
+        assets until the stored bytes fit in max_bytes. Pinned assets are skipped and do
+        not count towards max_bytes. Also clears abandoned partial downloads.
+
+        Returns:
+            Dict with the number of evicted entries and the unpinned bytes remaining.
+        """
+        now = time.time()
+        evictions_before = self.evictions
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT key, content_hash, path FROM assets WHERE last_access < ? "
+                "AND key NOT IN (SELECT key FROM pins)", (now - self.max_age_seconds,)
+            ).fetchall()
+            self._delete_rows(expired)
+
+            # Files shared by several keys count once.
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM assets "
+                "WHERE key NOT IN (SELECT key FROM pins) GROUP BY content_hash)"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for row in self._db.execute(
+                    "SELECT key, content_hash, path, size FROM assets "
+                    "WHERE key NOT IN (SELECT key FROM pins) ORDER BY last_access"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append(row)
+                    total -= row["size"]
+                self._delete_rows(victims)
+            self._db.commit()
+
+        staging = os.path.join(self.directory, STAGING_DIR)
+        for name in os.listdir(staging):
+            path = os.path.join(staging, name)
+            try:
+                if now - os.path.getmtime(path) > 3600:
+                    os.remove(path)
+            except OSError:
+                pass
+        return {"evicted": self.evictions - evictions_before, "bytes": max(0, total)}
+
+    def start_gc(self, interval_seconds: float = DEFAULT_GC_INTERVAL_SECONDS):
+        """Run collect_garbage() every `interval_seconds` on a daemon thread."""
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            return
+
+        def loop():
+            while not self._gc_stop.wait(interval_seconds):
+                try:
+                    result = self.collect_garbage()
+                    if result["evicted"]:
+                        print(f"[asset_store] GC evicted {result['evicted']} assets, {result['bytes'] / 1e6:.1f} MB kept")
+                except Exception as e:
+                    print(f"[asset_store] GC failed: {e}")
+
+        self._gc_stop.clear()
+        self._gc_thread = threading.Thread(target=loop, name="asset-store-gc", daemon=True)
+        self._gc_thread.start()
+
+    def stop_gc(self):
+        self._gc_stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, stored_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM assets").fetchone()
+        return {"downloads": self.downloads, "revalidations": self.revalidations, "hits": self.hits,
+                "evictions": self.evictions, "entries": entries, "bytes": stored_bytes}
+
+
+_default_store: Optional[AssetStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> AssetStore:
+    """Process-wide store shared by every session, with its garbage collector running."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = AssetStore()
+                _default_store.start_gc()
+    return _default_store
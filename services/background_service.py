@@ -1,24 +1,21 @@
 # services/background_service.py.
 
 from typing import Dict, Any, Optional
-import requests
 import base64
-import os
-from dotenv import load_dotenv
 
-# Load your .env file for the API key
-load_dotenv()
-BRIA_API_KEY = os.getenv("BRIA_API_KEY")
-if not BRIA_API_KEY:
-    raise RuntimeError("BRIA_API_KEY not found in environment variables")
+from . import http_client, matte_cache, preflight, result_cache, upload_optimizer
+from .settings import get_settings
+from .streaming_body import Base64Field, StreamingJSONBody
 
 
+@result_cache.cached("remove_background")
 def remove_background(
     api_key: Optional[str] = None,
     image_data: bytes = None,
     image_url: str = None,
     force: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
 ) -> bytes:
     """
     Remove the background from an image.
@@ -29,18 +26,28 @@ def remove_background(
         image_url: Public URL of the image (alternative to image_data)
         force: Whether to force background removal even if alpha channel exists
         content_moderation: Whether to enable content moderation
+        optimize_uploads: Shrink the upload first (see services.upload_optimizer); None uses the default
 
     Returns:
         Raw bytes of the background‑removed image (PNG with transparency)
 
     Raises:
-        ValueError: if neither image_data nor image_url is provided
+        ValueError: if neither image_data nor image_url is provided, or the input fails the
+            local checks in services.preflight (unreadable image, unreachable URL)
         Exception: on HTTP or API errors
     """
-    key = api_key or BRIA_API_KEY
+    key = api_key or get_settings().bria_api_key
     if not key:
         raise RuntimeError("API key must be provided")
 
+    # Keyed before the upload, which may read a file object to its end.
+    source = matte_cache.source_key(image_data, image_url)
+    cached = None if force or not matte_cache.is_enabled() else matte_cache.lookup(source, kinds=("cutout",))
+    if cached:
+        print("[remove_background] Using the cached cutout of this image")
+        with open(cached, "rb") as f:
+            return f.read()
+
     url = "https://engine.prod.bria-api.com/v1/product/remove_background"
     headers = {
         "api_token": key,
@@ -55,9 +62,12 @@ def remove_background(
     }
 
     if image_url:
+        preflight.check_url(image_url)
         payload["image_url"] = image_url
     elif image_data:
-        payload["file"] = base64.b64encode(image_data).decode("utf-8")
+        preflight.check_image(image_data)
+        upload = upload_optimizer.prepare_upload(image_data, "/v1/product/remove_background", enabled=optimize_uploads)
+        payload["file"] = Base64Field(upload)
     else:
         raise ValueError("Either image_data or image_url must be provided")
 
@@ -67,21 +77,25 @@ def remove_background(
         print(f"[remove_background] Headers: {headers}")
         print(f"[remove_background] Payload keys: {list(payload.keys())}")
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_client.post(url, headers=headers, data=StreamingJSONBody(payload))
         response.raise_for_status()
 
         # The API returns JSON with a 'result_url' or possibly inline base64
         data = response.json()
         if "result_url" in data:
             # Fetch the PNG from the returned URL
-            img_resp = requests.get(data["result_url"])
+            img_resp = http_client.get(data["result_url"])
             img_resp.raise_for_status()
-            return img_resp.content
+            cutout = img_resp.content
         elif "file" in data:
             # If the API inlines base64‑encoded PNG
-            return base64.b64decode(data["file"])
+            cutout = base64.b64decode(data["file"])
         else:
             raise Exception(f"Unexpected response format: {data}")
 
     except Exception as e:
         raise Exception(f"Background removal failed: {str(e)}")
+
+    # Later tools on the same image can reuse this cutout (see services.matte_cache).
+    matte_cache.remember(source, cutout, "cutout")
+    return cutout
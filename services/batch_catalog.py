@@ -0,0 +1,289 @@
+# services/batch_catalog.py
+#
+# Headless bulk runner for the product tools.
+#
+#   python -m services.batch_catalog manifest.csv --tool packshot --out catalog_results --workers 8
+#
+# The manifest is CSV or JSONL with one row per SKU: a `sku` column, an `image` column
+# (local path or URL; `image_path` / `image_url` also work) and optional extra columns
+# that are passed to the tool as keyword arguments, e.g. `background_color` or
+# `scene_description`. Interrupted runs resume from <out>/checkpoint.jsonl.
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import http_client
+from .settings import get_settings
+from .product_service import create_product_packshot, add_product_shadow, create_lifestyle_shot_by_text
+
+TOOLS = {
+    "packshot": create_product_packshot,
+    "shadow": add_product_shadow,
+    "lifestyle": create_lifestyle_shot_by_text,
+}
+
+# Manifest columns kept verbatim rather than JSON-decoded (SKU "00123" must not become 123).
+RAW_COLUMNS = {"sku", "image", "image_path", "image_url", "scene_description", "exclude_elements"}
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+# Async results (e.g. lifestyle with sync=False) are polled until ready or this many seconds pass.
+RESULT_WAIT_SECONDS = 300
+# Answers of an async result URL whose file has not been written yet; anything else but 200 is an error.
+NOT_READY_STATUSES = (202, 404)
+PROGRESS_INTERVAL = 10  # seconds between progress lines
+
+
+def _parse_cell(value: str):
+    """CSV cells are strings; decode JSON literals such as numbers, booleans and lists."""
+    value = value.strip()
+    if value == "":
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def read_manifest(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield manifest rows from a .csv or .jsonl file."""
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+    else:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                parsed = {}
+                for key, value in row.items():
+                    if not key:
+                        continue
+                    key = key.strip()
+                    value = (value or "").strip()
+                    parsed[key] = (value or None) if key in RAW_COLUMNS else _parse_cell(value)
+                yield parsed
+
+
+def load_checkpoint(output_dir: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Return the last successful checkpoint record per (SKU, tool)."""
+    finished = {}
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn last line from an interrupted run.
+            if record.get("status") == "ok":
+                finished[(record["sku"], record.get("tool"))] = record
+    return finished
+
+
+def _extract_result_urls(result: Dict[str, Any]) -> List[str]:
+    if "result_url" in result:
+        return [result["result_url"]]
+    urls = []
+    for item in result.get("result", []):
+        if isinstance(item, list) and item and item[0]:
+            urls.append(item[0])
+        elif isinstance(item, str) and item:
+            urls.append(item)
+    return urls
+
+
+def _download_result(url: str, destination: str, wait_seconds: float = RESULT_WAIT_SECONDS):
+    """
+    Stream a result to disk, waiting for async results that are not ready yet.
+    Any other error status is raised as an HTTPError.
+    """
+    deadline = time.monotonic() + wait_seconds
+    delay = 2.0
+    while True:
+        response = http_client.get(url, stream=True)
+        if response.status_code == 200:
+            temp_path = destination + ".part"
+            with open(temp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            os.replace(temp_path, destination)
+            return
+        response.close()
+        if response.status_code not in NOT_READY_STATUSES:
+            response.raise_for_status()
+            raise RuntimeError(f"Unexpected HTTP {response.status_code} for result {url}")
+        if time.monotonic() + delay > deadline:
+            raise TimeoutError(f"Result not ready after {wait_seconds}s: {url}")
+        time.sleep(delay)
+        delay = min(delay * 1.5, 15.0)
+
+
+def _safe_name(sku: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(sku))
+
+
+def process_row(tool: str, row: Dict[str, Any], output_dir: str, api_key: str,
+                defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run one manifest row through a product tool and save its results. Returns a checkpoint record."""
+    params = dict(defaults or {})
+    params.update({k: v for k, v in row.items() if v is not None})
+    sku = str(params.pop("sku"))
+    image = None
+    for column in ("image", "image_path", "image_url"):
+        image = image or params.pop(column, None)
+    if not image:
+        raise ValueError("row has no image, image_path or image_url")
+
+    if str(image).startswith(("http://", "https://")):
+        params["image_url"] = image
+    else:
+        with open(image, "rb") as f:
+            params["image_bytes"] = f.read()
+    params.setdefault("sku", sku)
+
+    result = TOOLS[tool](api_key=api_key, **params)
+    if not result or "error" in result:
+        raise RuntimeError(result.get("error") if result else "empty response")
+
+    urls = _extract_result_urls(result)
+    if not urls:
+        raise RuntimeError(f"no result URLs in response: {result}")
+
+    paths = []
+    for i, url in enumerate(urls):
+        if os.path.isfile(url):  # Served from the local result cache.
+            paths.append(url)
+            continue
+        extension = os.path.splitext(url.split("?")[0])[1] or ".png"
+        destination = os.path.join(output_dir, f"{_safe_name(sku)}_{tool}_{i + 1}{extension}")
+        _download_result(url, destination)
+        paths.append(destination)
+    return {"sku": sku, "status": "ok", "tool": tool, "paths": paths}
+
+
+class _Progress:
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.ok = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        done = self.ok + self.failed
+        elapsed = max(now - self.started, 1e-6)
+        rate = done / elapsed
+        remaining = self.total - self.skipped - done
+        eta = f"{remaining / rate / 60:.1f} min" if rate > 0 else "unknown"
+        print(f"[batch] {done + self.skipped}/{self.total} rows "
+              f"(ok={self.ok} failed={self.failed} resumed={self.skipped}) "
+              f"{rate * 60:.1f} rows/min, ETA {eta}")
+
+
+def run_batch(manifest_path: str, tool: str, output_dir: str, api_key: str, workers: int = 4,
+              defaults: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    Run a product tool over every row of a manifest.
+
+    Args:
+        manifest_path: CSV or JSONL manifest.
+        tool: One of "packshot", "shadow", "lifestyle".
+        output_dir: Where results and the checkpoint file are written.
+        api_key: Bria AI API key.
+        workers: Max concurrent API calls.
+        defaults: Parameters applied to every row unless the row overrides them.
+
+    Returns:
+        Dict with counts of ok, failed and resumed (skipped) rows.
+    """
+    if tool not in TOOLS:
+        raise ValueError(f"Unknown tool '{tool}'. Choose from: {', '.join(TOOLS)}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows = list(read_manifest(manifest_path))
+    finished = load_checkpoint(output_dir)
+    pending = [row for row in rows if (str(row.get("sku")), tool) not in finished]
+    progress = _Progress(total=len(rows), skipped=len(rows) - len(pending))
+    print(f"[batch] {tool}: {len(pending)} rows to process, {progress.skipped} already done")
+
+    checkpoint_lock = threading.Lock()
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), "a", encoding="utf-8") as checkpoint:
+        def record(entry):
+            with checkpoint_lock:
+                checkpoint.write(json.dumps(entry) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            row_iter = iter(pending)
+            while True:
+                # Keep the queue bounded so a huge manifest does not hold every image in memory.
+                while len(in_flight) < workers * 2:
+                    row = next(row_iter, None)
+                    if row is None:
+                        break
+                    future = executor.submit(process_row, tool, row, output_dir, api_key, defaults)
+                    in_flight[future] = row
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row = in_flight.pop(future)
+                    try:
+                        entry = future.result()
+                        progress.ok += 1
+                    except Exception as e:
+                        entry = {"sku": str(row.get("sku")), "status": "error", "tool": tool, "error": str(e)}
+                        progress.failed += 1
+                        print(f"[batch] SKU {row.get('sku')} failed: {e}")
+                    record(entry)
+                progress.report()
+
+    progress.report(force=True)
+    return {"ok": progress.ok, "failed": progress.failed, "resumed": progress.skipped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Bria product tool over a CSV/JSONL catalog manifest.")
+    parser.add_argument("manifest", help="CSV or JSONL manifest with sku and image columns")
+    parser.add_argument("--tool", choices=sorted(TOOLS), required=True)
+    parser.add_argument("--out", default="catalog_results", help="Output directory (default: catalog_results)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent API calls (default: 4)")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE",
+                        help="Default tool parameter for every row, e.g. background_color=#F0F0F0")
+    parser.add_argument("--api-key", default=None, help="Bria API key (default: BRIA_API_KEY from .env)")
+    args = parser.parse_args(argv)
+
+    api_key = args.api_key or get_settings().bria_api_key
+    if not api_key:
+        parser.error("No API key given and BRIA_API_KEY is not set")
+
+    defaults = {}
+    for item in args.param:
+        key, _, value = item.partition("=")
+        defaults[key.strip()] = _parse_cell(value)
+
+    summary = run_batch(args.manifest, args.tool, args.out, api_key, workers=args.workers, defaults=defaults)
+    print(f"[batch] finished: {summary}")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
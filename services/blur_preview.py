@@ -0,0 +1,64 @@
+# services/blur_preview.py
+#
+# CPU preview of /background/blur. When the subject's matte for an image is already
+# in the matte cache (from remove_image_background or product_cutout on the same URL),
+# the background is blurred locally with a separable Gaussian and the sharp subject is
+# composited back through the matte, so blur scales can be compared without an API
+# call each; blur_background is only needed for the final export.
+
+from typing import Optional
+
+from PIL import Image
+
+from . import asset_store, compositing, matte_cache
+
+# Blur radius per step of blur_background's `scale` (1-5), as a fraction of the image's
+# long side, so a preview and the full image look alike.
+RADIUS_PER_SCALE = 0.004
+MIN_SCALE, MAX_SCALE = 1, 5
+
+
+def blur_radius(size, scale: int) -> float:
+    """Gaussian radius in pixels for an image of `size` at blur_background `scale` (1-5)."""
+    scale = max(MIN_SCALE, min(MAX_SCALE, int(scale)))
+    return scale * RADIUS_PER_SCALE * max(size)
+
+
+def render_blur(image: Image.Image, matte: Image.Image, scale: int = 5) -> Image.Image:
+    """
+    Blur everything but the subject.
+
+    Args:
+        image: The original photo
+        matte: The subject cutout (RGBA) or its alpha ("L"); resized to `image` if needed
+        scale: Blur strength as in blur_background, 1 (least) to 5 (most)
+
+    Returns:
+        RGB image with a blurred background and the subject left sharp
+    """
+    image = image.convert("RGB")
+    alpha = matte.getchannel("A") if "A" in matte.getbands() else matte.convert("L")
+    if alpha.size != image.size:
+        alpha = alpha.resize(image.size, Image.BILINEAR)
+    blurred = compositing.gaussian_blur(image, blur_radius(image.size, scale))
+    return Image.composite(image, blurred, alpha)
+
+
+def load_preview_sources(image_url: str, max_side: int = compositing.PREVIEW_MAX_SIDE):
+    """
+    Downscaled (image, matte alpha) for previewing blurs of `image_url`, or None when no
+    cutout of that image is cached yet. The image itself comes through the asset store.
+    """
+    matte_path = matte_cache.lookup(matte_cache.source_key(image_url=image_url), kinds=("cutout",))
+    if matte_path is None:
+        return None
+    image, _ = compositing.preview_copy(Image.open(asset_store.get_store().get_path(image_url)).convert("RGB"), max_side)
+    matte = Image.open(matte_path)
+    alpha = matte.getchannel("A") if "A" in matte.getbands() else matte.convert("L")
+    return image, alpha.resize(image.size, Image.BILINEAR)
+
+
+def preview_blur(image_url: str, scale: int = 5, max_side: int = compositing.PREVIEW_MAX_SIDE) -> Optional[Image.Image]:
+    """render_blur on a downscaled copy of `image_url`, or None if its matte is not cached."""
+    sources = load_preview_sources(image_url, max_side)
+    return render_blur(*sources, scale=scale) if sources else None
@@ -0,0 +1,107 @@
+# services/compositing.py
+#
+# Local compositing for previews of the product tools (shadow, recolor, blur). Layers
+# are 8-bit PIL images so blending and blurring run in PIL's C loops: "over" is
+# Image.alpha_composite, masked blends are Image.composite and blurs are PIL's
+# separable Gaussian. NumPy is only used to build alpha layers (e.g. a shadow shape),
+# so a 1024 px preview renders in tens of milliseconds.
+
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Longest side used for interactive previews; parameters in pixels are scaled to match.
+PREVIEW_MAX_SIDE = 1024
+
+
+def hex_to_rgb(color: str) -> Tuple[int, int, int]:
+    """Parse "#RRGGBB", "RRGGBB" or "#RGB" into an (r, g, b) tuple."""
+    value = color.strip().lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    if len(value) != 6:
+        raise ValueError(f"Invalid hex colour: {color!r}")
+    return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+
+
+def preview_copy(img: Image.Image, max_side: int = PREVIEW_MAX_SIDE) -> Tuple[Image.Image, float]:
+    """Downscale an image for previewing; returns (image, scale factor applied)."""
+    scale = min(1.0, max_side / max(img.size))
+    if scale >= 1.0:
+        return img, 1.0
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.LANCZOS), scale
+
+
+def gaussian_blur(img: Image.Image, radius: float) -> Image.Image:
+    """Separable Gaussian blur (PIL's, in C); radius 0 returns the image unchanged."""
+    return img.filter(ImageFilter.GaussianBlur(radius)) if radius > 0 else img
+
+
+def shift(layer: Image.Image, dx: int, dy: int) -> Image.Image:
+    """Translate a layer by (dx, dy) pixels; the uncovered area is zero (transparent/black)."""
+    if dx == 0 and dy == 0:
+        return layer
+    out = Image.new(layer.mode, layer.size)
+    out.paste(layer, (dx, dy))
+    return out
+
+
+def scale_alpha(alpha: Image.Image, opacity: float) -> Image.Image:
+    """Multiply an "L" layer by `opacity` (0..1) through a lookup table."""
+    if opacity >= 1.0:
+        return alpha
+    opacity = max(0.0, opacity)
+    return alpha.point([int(round(v * opacity)) for v in range(256)])
+
+
+def colour_layer(color: str, alpha: Image.Image) -> Image.Image:
+    """An RGBA layer of a single colour whose opacity is `alpha`."""
+    layer = Image.new("RGBA", alpha.size, hex_to_rgb(color) + (255,))
+    layer.putalpha(alpha)
+    return layer
+
+
+def background(size: Tuple[int, int], color: Optional[str]) -> Image.Image:
+    """An opaque RGBA canvas of `color`, or a fully transparent one for None."""
+    if color is None:
+        return Image.new("RGBA", size, (0, 0, 0, 0))
+    return Image.new("RGBA", size, hex_to_rgb(color) + (255,))
+
+
+def over(*layers: Image.Image) -> Image.Image:
+    """Porter-Duff "over" of RGBA layers, bottom first."""
+    result = layers[0]
+    for layer in layers[1:]:
+        result = Image.alpha_composite(result, layer)
+    return result
+
+
+def finish(img: Image.Image, transparent: bool) -> Image.Image:
+    """Drop the alpha channel of an opaque result."""
+    return img if transparent else img.convert("RGB")
+
+
+def alpha_bbox(alpha: Image.Image, threshold: int = 127) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box (left, top, right, bottom) of alpha above `threshold`, or None."""
+    return alpha.point(lambda v: 255 if v > threshold else 0).getbbox()
+
+
+def radial_falloff(size: Tuple[int, int], center: Tuple[float, float], radii: Tuple[float, float]) -> Image.Image:
+    """
+    "L" layer of an ellipse that is opaque at `center` and fades to zero at its rim.
+    Only the ellipse's bounding box is computed.
+    """
+    width, height = size
+    (cx, cy), (rx, ry) = center, radii
+    left, right = max(0, int(cx - rx)), min(width, int(np.ceil(cx + rx)) + 1)
+    top, bottom = max(0, int(cy - ry)), min(height, int(np.ceil(cy + ry)) + 1)
+    layer = Image.new("L", size)
+    if left >= right or top >= bottom:
+        return layer
+    xs = ((np.arange(left, right, dtype=np.float32) - cx) / rx) ** 2
+    ys = ((np.arange(top, bottom, dtype=np.float32) - cy) / ry) ** 2
+    falloff = np.clip(1.0 - (ys[:, None] + xs[None, :]), 0.0, 1.0)
+    layer.paste(Image.fromarray((falloff * 255.0 + 0.5).astype(np.uint8), "L"), (left, top))
+    return layer
@@ -1,8 +1,19 @@
-from typing import Dict, Any, Optional
-import requests
-import base64
+from typing import Dict, Any, Optional, Tuple
 
-def generative_fill(
+from . import history, http_client, preflight, result_cache, upload_optimizer
+from .streaming_body import Base64Field, StreamingJSONBody
+
+def _conform_mask(image_data, mask_data, image_size=None):
+    """Binarize and resize the mask to match the image (see services.mask_ops.conform)."""
+    from . import mask_ops  # numpy/PIL, loaded on first use
+
+    try:
+        return mask_ops.conform(mask_data, image_data, image_size)
+    except (OSError, ValueError) as e:
+        print(f"Sending mask unchanged, could not check it against the image: {e}")
+        return mask_data
+
+def _build_generative_fill_request(
     api_key: str,
     image_data: bytes,
     mask_data: bytes,
@@ -12,63 +23,118 @@ def generative_fill(
     sync: bool = False,
     seed: Optional[int] = None,
     content_moderation: bool = False,
-    mask_type: str = "manual"
-) -> Dict[str, Any]:
-    """
-    Generate content in a masked area of an image using a text prompt.
-    
-    Args:
-        api_key: Bria AI API key
-        image_data: Image data in bytes
-        mask_data: Mask image data in bytes
-        prompt: Description of what to generate in the masked area
-        negative_prompt: Description of what to avoid (optional)
-        num_results: Number of variations to generate (1-4)
-        sync: Whether to wait for results
-        seed: Optional seed for reproducible results
-        content_moderation: Whether to enable content moderation
-        mask_type: Type of mask ('manual' or 'automatic')
-    """
+    mask_type: str = "manual",
+    optimize_uploads: Optional[bool] = None
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the (url, headers, data) triple for a generative fill request."""
     url = "https://engine.prod.bria-api.com/v1/gen_fill"
-    
+
     headers = {
         'api_token': api_key,
         'Accept': 'application/json',
         'Content-Type': 'application/json'
     }
-    
-    # Convert image and mask to base64.
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    mask_base64 = base64.b64encode(mask_data).decode('utf-8')
-    
-    # Prepare request data
+
+    image_size = preflight.check_image(image_data)
+    # The API needs a binary mask at the image's resolution; canvas masks are drawn on a preview.
+    mask_data = _conform_mask(image_data, mask_data, image_size)
+    preflight.check_mask(mask_data)
+
+    # Shrink oversized uploads (when enabled); the mask is resized to match.
+    image_data, mask_data = upload_optimizer.prepare_image_and_mask(image_data, mask_data, "/v1/gen_fill",
+                                                                    enabled=optimize_uploads)
+
+    # Image and mask are base64-encoded chunk by chunk while the body is sent.
     data = {
-        'file': image_base64,
-        'mask_file': mask_base64,
+        'file': Base64Field(image_data),
+        'mask_file': Base64Field(mask_data),
         'mask_type': mask_type,
         'prompt': prompt,
         'num_results': num_results,
         'sync': sync,
         'content_moderation': content_moderation
     }
-    
+
     # Add optional parameters
     if negative_prompt:
         data['negative_prompt'] = negative_prompt
     if seed is not None:
         data['seed'] = seed
-    
+
+    return url, headers, data
+
+def _read_generative_fill_response(response) -> Dict[str, Any]:
+    response.raise_for_status()
+
+    print(f"Response status: {response.status_code}")
+    print(f"Response body: {response.text}")
+
+    return response.json()
+
+@result_cache.cached("generative_fill", when=result_cache.fixed_seed)
+@history.recorded("/v1/gen_fill")
+def generative_fill(
+    api_key: str,
+    image_data: bytes,
+    mask_data: bytes,
+    prompt: str,
+    negative_prompt: Optional[str] = None,
+    num_results: int = 4,
+    sync: bool = False,
+    seed: Optional[int] = None,
+    content_moderation: bool = False,
+    mask_type: str = "manual",
+    optimize_uploads: Optional[bool] = None
+) -> Dict[str, Any]:
+    """
+    Generate content in a masked area of an image using a text prompt.
+
+    Args:
+        api_key: Bria AI API key
+        image_data: Image data in bytes (or a seekable binary file object)
+        mask_data: Mask image data in bytes (or a seekable binary file object)
+        prompt: Description of what to generate in the masked area
+        negative_prompt: Description of what to avoid (optional)
+        num_results: Number of variations to generate (1-4)
+        sync: Whether to wait for results
+        seed: Optional seed for reproducible results
+        content_moderation: Whether to enable content moderation
+        mask_type: Type of mask ('manual' or 'automatic')
+        optimize_uploads: Shrink the upload first (see services.upload_optimizer); None uses the default
+    """
+    url, headers, data = _build_generative_fill_request(
+        api_key,
+        image_data,
+        mask_data,
+        prompt,
+        negative_prompt=negative_prompt,
+        num_results=num_results,
+        sync=sync,
+        seed=seed,
+        content_moderation=content_moderation,
+        mask_type=mask_type,
+        optimize_uploads=optimize_uploads
+    )
+
     try:
         print(f"Making request to: {url}")
         print(f"Headers: {headers}")
         print(f"Data: {data}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
+
+        response = http_client.post(url, headers=headers, data=StreamingJSONBody(data))
+        return _read_generative_fill_response(response)
+    except Exception as e:
+        raise Exception(f"Generative fill failed: {str(e)}")
+
+@history.recorded("/v1/gen_fill", like=generative_fill)
+async def generative_fill_async(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of generative_fill. Takes the same arguments and returns the same result."""
+    url, headers, data = await preflight.arun(_build_generative_fill_request, *args, **kwargs)
+
+    try:
+        print(f"Making async request to: {url}")
+
+        response = await http_client.apost(url, headers=headers, data=StreamingJSONBody(data))
+        return _read_generative_fill_response(response)
     except Exception as e:
-        raise Exception(f"Generative fill failed: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Generative fill failed: {str(e)}")
\ No newline at end of file
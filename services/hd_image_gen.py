@@ -1,8 +1,9 @@
-from typing import Dict, Any, Optional, Union
-import requests
+from typing import Dict, Any, Optional, Tuple, Union
 import json
 
-def generate_hd_image(
+from . import history, http_client, result_cache
+
+def _build_hd_image_request(
     prompt: str,
     api_key: str,
     model_version: str = "2.2",
@@ -18,30 +19,11 @@ def generate_hd_image(
     enhance_image: bool = False,
     content_moderation: bool = False,
     ip_signal: bool = False
-) -> Dict[str, Any]:
-    """Generate HD image from prompt using Bria's text-to-image API.
-    
-    Args:
-        prompt: The prompt to generate images from
-        api_key: API key for authentication
-        model_version: Model version to use (default: "2.2")
-        num_results: Number of images to generate (1-4)
-        aspect_ratio: Image aspect ratio ("1:1", "2:3", "3:2", etc.)
-        sync: Whether to wait for results or get URLs immediately
-        seed: Optional seed for reproducible results
-        negative_prompt: Elements to exclude from generation
-        steps_num: Number of refinement iterations (20-50)
-        text_guidance_scale: How closely to follow text (1-10)
-        medium: Generation medium ("photography" or "art")
-        prompt_enhancement: Whether to enhance the prompt
-        enhance_image: Whether to enhance image quality
-        content_moderation: Whether to enable content moderation
-        ip_signal: Whether to flag potential IP content
-    """
-    
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the (url, headers, data) triple for a text-to-image HD request."""
     if not prompt:
         raise ValueError("Prompt is required for image generation")
-    
+
     # Build request data with only provided parameters.
     data = {
         "prompt": prompt,
@@ -49,7 +31,7 @@ def generate_hd_image(
         "sync": sync,
         "negative_prompt": negative_prompt
     }
-    
+
     # Add optional parameters only if they have valid values
     if aspect_ratio:
         data["aspect_ratio"] = aspect_ratio
@@ -69,25 +51,99 @@ def generate_hd_image(
         data["content_moderation"] = content_moderation
     if ip_signal:
         data["ip_signal"] = ip_signal
-    
+
     url = f"https://engine.prod.bria-api.com/v1/text-to-image/hd/{model_version}"
     headers = {
         'api_token': api_key,
         'Accept': 'application/json',
         'Content-Type': 'application/json'
     }
-    
+    return url, headers, data
+
+def _read_hd_image_response(response) -> Dict[str, Any]:
+    response.raise_for_status()
+
+    print(f"Response status: {response.status_code}")
+    print(f"Response body: {response.text}")
+
+    return response.json()
+
+@result_cache.cached("generate_hd_image", when=result_cache.fixed_seed)
+@history.recorded("/v1/text-to-image/hd")
+def generate_hd_image(
+    prompt: str,
+    api_key: str,
+    model_version: str = "2.2",
+    num_results: int = 1,
+    aspect_ratio: str = "1:1",
+    sync: bool = True,
+    seed: Optional[int] = None,
+    negative_prompt: str = "",
+    steps_num: Optional[int] = None,
+    text_guidance_scale: Optional[float] = None,
+    medium: Optional[str] = None,
+    prompt_enhancement: bool = False,
+    enhance_image: bool = False,
+    content_moderation: bool = False,
+    ip_signal: bool = False
+) -> Dict[str, Any]:
+    """Generate HD image from prompt using Bria's text-to-image API.
+
+    Args:
+        prompt: The prompt to generate images from
+        api_key: API key for authentication
+        model_version: Model version to use (default: "2.2")
+        num_results: Number of images to generate (1-4)
+        aspect_ratio: Image aspect ratio ("1:1", "2:3", "3:2", etc.)
+        sync: Whether to wait for results or get URLs immediately
+        seed: Optional seed for reproducible results
+        negative_prompt: Elements to exclude from generation
+        steps_num: Number of refinement iterations (20-50)
+        text_guidance_scale: How closely to follow text (1-10)
+        medium: Generation medium ("photography" or "art")
+        prompt_enhancement: Whether to enhance the prompt
+        enhance_image: Whether to enhance image quality
+        content_moderation: Whether to enable content moderation
+        ip_signal: Whether to flag potential IP content
+    """
+    url, headers, data = _build_hd_image_request(
+        prompt=prompt,
+        api_key=api_key,
+        model_version=model_version,
+        num_results=num_results,
+        aspect_ratio=aspect_ratio,
+        sync=sync,
+        seed=seed,
+        negative_prompt=negative_prompt,
+        steps_num=steps_num,
+        text_guidance_scale=text_guidance_scale,
+        medium=medium,
+        prompt_enhancement=prompt_enhancement,
+        enhance_image=enhance_image,
+        content_moderation=content_moderation,
+        ip_signal=ip_signal
+    )
+
     try:
         print(f"Making request to: {url}")
         print(f"Headers: {headers}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        return response.json()
-        
+
+        response = http_client.post(url, headers=headers, json=data)
+        return _read_hd_image_response(response)
+
+    except Exception as e:
+        raise Exception(f"HD image generation failed: {str(e)}")
+
+@history.recorded("/v1/text-to-image/hd", like=generate_hd_image)
+async def generate_hd_image_async(*args, **kwargs) -> Dict[str, Any]:
+    """Async variant of generate_hd_image. Takes the same arguments and returns the same result."""
+    url, headers, data = _build_hd_image_request(*args, **kwargs)
+
+    try:
+        print(f"Making async request to: {url}")
+
+        response = await http_client.apost(url, headers=headers, json=data)
+        return _read_hd_image_response(response)
+
     except Exception as e:
-        raise Exception(f"HD image generation failed: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"HD image generation failed: {str(e)}")
\ No newline at end of file
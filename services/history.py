@@ -0,0 +1,389 @@
+# services/history.py
+#
+# Generation history: one row per result of generate_hd_image, generative_fill (plain and
+# ROI) and create_lifestyle_shot_by_text, with the prompt or scene description, seed,
+# aspect ratio, SKU, endpoint and result URL. Rows live in a SQLite file next to the
+# asset store, so they survive Streamlit sessions; an FTS5 index covers prompts and scene
+# descriptions and B-tree indexes cover SKU, endpoint and date, so finding a past asset
+# and opening its stored copy takes milliseconds instead of a paid regeneration.
+#
+# Results are kept in the asset store, pinned per row so its garbage collector does not
+# evict them; deleting a row releases its pins.
+#
+# Service functions are wrapped with @recorded(endpoint); recording failures are only
+# logged. Turn recording off with disable() or BRIA_HISTORY=0.
+
+import asyncio
+import contextlib
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from . import asset_store
+
+DB_FILE = "history.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    sku TEXT,
+    prompt TEXT,
+    scene_description TEXT,
+    negative_prompt TEXT,
+    seed INTEGER,
+    aspect_ratio TEXT,
+    params TEXT NOT NULL,
+    result_url TEXT,
+    result_path TEXT
+);
+CREATE INDEX IF NOT EXISTS generations_created ON generations (created_at);
+CREATE INDEX IF NOT EXISTS generations_sku ON generations (sku, created_at);
+CREATE INDEX IF NOT EXISTS generations_endpoint ON generations (endpoint, created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(
+    prompt, scene_description, content='generations', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts (rowid, prompt, scene_description)
+    VALUES (new.id, new.prompt, new.scene_description);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+    INSERT INTO generations_fts (generations_fts, rowid, prompt, scene_description)
+    VALUES ('delete', old.id, old.prompt, old.scene_description);
+END;
+"""
+
+# Arguments that get their own column; other JSON-friendly arguments go into `params`.
+COLUMNS = ("sku", "prompt", "scene_description", "negative_prompt", "seed", "aspect_ratio")
+IGNORED_PARAMS = {"api_key"}
+
+_enabled = os.getenv("BRIA_HISTORY", "1").lower() not in ("0", "false", "no")
+_local = threading.local()
+# Downloads recorded result URLs into the asset store while their links are valid.
+_fetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history")
+
+
+def enable():
+    """Record generations (the default)."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextlib.contextmanager
+def paused():
+    """Don't record calls made by this thread inside the block (e.g. the crops of an ROI fill)."""
+    previous = getattr(_local, "paused", False)
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = previous
+
+
+class History:
+    """SQLite-backed generation history. Safe to share between threads."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def add(self, endpoint: str, results: List[Dict[str, Any]], params: Dict[str, Any]) -> List[int]:
+        """
+        Insert one row per result.
+
+        Args:
+            endpoint: API endpoint path, e.g. "/v1/gen_fill"
+            results: Dicts with "url" or "path", and optionally the result's own "seed"
+            params: The call's arguments; non-JSON values (image bytes, files) are dropped
+
+        Returns:
+            Ids of the new rows
+        """
+        columns = {name: params.get(name) for name in COLUMNS}
+        if columns["aspect_ratio"] is not None:
+            columns["aspect_ratio"] = str(columns["aspect_ratio"])
+        extra = {k: v for k, v in params.items()
+                 if k not in COLUMNS and k not in IGNORED_PARAMS and _is_plain(v)}
+        now = time.time()
+        ids = []
+        with self._lock:
+            for result in results:
+                seed = result.get("seed", columns["seed"])
+                cursor = self._db.execute(
+                    "INSERT INTO generations (created_at, endpoint, sku, prompt, scene_description, negative_prompt, "
+                    "seed, aspect_ratio, params, result_url, result_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now, endpoint, columns["sku"], columns["prompt"], columns["scene_description"],
+                     columns["negative_prompt"], seed if isinstance(seed, int) else None, columns["aspect_ratio"],
+                     json.dumps(extra, sort_keys=True), result.get("url"), result.get("path"))
+                )
+                ids.append(cursor.lastrowid)
+            self._db.commit()
+        return ids
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        sku: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Most recent generations matching all given filters.
+
+        Args:
+            text: Words to find in prompts and scene descriptions (the last one may be a prefix)
+            sku: Exact SKU
+            endpoint: Exact endpoint path
+            since / until: Creation time bounds as Unix timestamps
+            limit: Max rows returned
+
+        Returns:
+            Rows as dicts, newest first; "params" is decoded
+        """
+        where, args = [], []
+        if text and text.split():
+            where.append("id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)")
+            args.append(fts_query(text))
+        for column, value in (("sku", sku), ("endpoint", endpoint)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        sql = "SELECT * FROM generations"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, args + [max(1, int(limit))]).fetchall()
+        return [_row_dict(row) for row in rows]
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM generations WHERE id = ?", (entry_id,)).fetchone()
+        return _row_dict(row) if row is not None else None
+
+    def distinct(self, column: str) -> List[str]:
+        """Values recorded for "sku" or "endpoint", for filter menus."""
+        if column not in ("sku", "endpoint"):
+            raise ValueError(f"Not a filter column: {column}")
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT DISTINCT {column} FROM generations WHERE {column} IS NOT NULL ORDER BY {column}"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def result_path(self, entry_id: int) -> Optional[str]:
+        """
+        Local file of a recorded result: its stored copy if still on disk, otherwise
+        fetched through the asset store (which also serves copies of expired links).
+        Returns None if the result is gone.
+        """
+        entry = self.get(entry_id)
+        if entry is None:
+            return None
+        if entry["result_path"] and os.path.isfile(entry["result_path"]):
+            return entry["result_path"]
+        if not entry["result_url"]:
+            return None
+        try:
+            path = asset_store.get_store().get_path(entry["result_url"])
+        except Exception as e:
+            print(f"[history] Result {entry_id} is no longer available: {e}")
+            return None
+        with self._lock:
+            self._db.execute("UPDATE generations SET result_path = ? WHERE id = ?", (path, entry_id))
+            self._db.commit()
+        return path
+
+    def delete(self, entry_id: int):
+        """Delete a row and release its result from the asset store."""
+        with self._lock:
+            self._db.execute("DELETE FROM generations WHERE id = ?", (entry_id,))
+            self._db.commit()
+        asset_store.get_store().unpin(_pin_owner(entry_id))
+
+
+def fts_query(text: str) -> str:
+    """FTS5 query matching all words of free text; the last word also matches as a prefix."""
+    terms = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _is_plain(value) -> bool:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(_is_plain(v) for v in value)
+    if isinstance(value, dict):
+        return all(isinstance(k, str) and _is_plain(v) for k, v in value.items())
+    return False
+
+
+def _pin_owner(entry_id: int) -> str:
+    return f"history:{entry_id}"
+
+
+def _keep_copy(url: str):
+    try:
+        asset_store.get_store().get_path(url)
+    except Exception as e:
+        # Async results may not be ready yet; result_path() fetches them later.
+        print(f"[history] Result not stored yet, {url}: {e}")
+
+
+def _row_dict(row) -> Dict[str, Any]:
+    entry = dict(row)
+    entry["params"] = json.loads(entry["params"])
+    return entry
+
+
+def result_entries(result) -> List[Dict[str, Any]]:
+    """
+    The results of an API response as {"url" or "path", "seed"} dicts. Handles
+    text-to-image ({"result": [{"urls", "seed"}]}), lifestyle ({"result": [[url, seed,
+    session]]}), generative fill ({"urls", "seeds"}) and single "result_url" responses;
+    local paths (ROI fill composites) are recorded as paths.
+    """
+    if not isinstance(result, dict):
+        return []
+    entries = []
+
+    def add(location, seed=None):
+        if location:
+            key = "url" if str(location).startswith(("http://", "https://")) else "path"
+            entries.append({key: location, "seed": seed} if seed is not None else {key: location})
+
+    if result.get("result_url"):
+        add(result["result_url"])
+    seeds = result.get("seeds") or []
+    for index, location in enumerate(result.get("urls") or []):
+        add(location, seeds[index] if index < len(seeds) else result.get("seed"))
+    for item in result.get("result") or []:
+        if isinstance(item, dict):
+            for location in item.get("urls") or []:
+                add(location, item.get("seed"))
+        elif isinstance(item, list) and item:
+            add(item[0], item[1] if len(item) > 1 and isinstance(item[1], int) else None)
+        elif isinstance(item, str):
+            add(item)
+    return entries
+
+
+_default_history: Optional[History] = None
+_default_history_lock = threading.Lock()
+
+
+def get_history() -> History:
+    """The process-wide history, stored in the asset store's directory."""
+    global _default_history
+    if _default_history is None:
+        with _default_history_lock:
+            if _default_history is None:
+                _default_history = History(os.path.join(asset_store.get_store().directory, DB_FILE))
+    return _default_history
+
+
+def record(endpoint: str, result, params: Dict[str, Any]) -> List[int]:
+    """
+    Record the results of one call; returns the new row ids (none when disabled or paused).
+    Local results are copied into the asset store and URLs are downloaded into it in the
+    background; both are pinned there for as long as their row exists.
+    """
+    if not _enabled or getattr(_local, "paused", False):
+        return []
+    if isinstance(result, dict) and result.get("regions") and not params.get("prompt"):
+        # multi_region_fill: one composite from several prompts.
+        params = dict(params, prompt=" | ".join(r["prompt"] for r in result["regions"] if r.get("prompt")),
+                      regions=result["regions"])
+    entries = result_entries(result)
+    if not entries:
+        return []
+    try:
+        store = asset_store.get_store()
+        for entry in entries:
+            if "path" in entry:
+                with open(entry["path"], "rb") as f:
+                    entry["path"] = store.put(f.read(), os.path.splitext(entry["path"])[1] or ".png")
+        ids = get_history().add(endpoint, entries, params)
+        for entry_id, entry in zip(ids, entries):
+            store.pin(entry.get("url") or entry["path"], _pin_owner(entry_id))
+    except (sqlite3.Error, OSError) as e:
+        print(f"[history] Not recorded: {e}")
+        return []
+    for entry in entries:
+        if "url" in entry:
+            _fetcher.submit(_keep_copy, entry["url"])
+    return ids
+
+
+def recorded(endpoint: str, like=None):
+    """
+    Record every successful call of a service function in the history.
+
+    Args:
+        endpoint: API endpoint path stored with each row
+        like: Function whose signature names the arguments, for async variants that
+              take *args/**kwargs; defaults to the decorated function
+    """
+    def decorator(func):
+        signature = inspect.signature(like or func)
+
+        def record_call(args, kwargs, result):
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError:
+                return
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            for name, parameter in signature.parameters.items():
+                if parameter.kind is inspect.Parameter.VAR_KEYWORD:
+                    arguments.update(arguments.pop(name, {}))  # e.g. roi_generative_fill's seed
+            record(endpoint, result, arguments)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                result = await func(*args, **kwargs)
+                # SQLite writes and asset-store pins are file I/O; keep them off the event loop.
+                await asyncio.to_thread(record_call, args, kwargs, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            record_call(args, kwargs, result)
+            return result
+        return wrapper
+
+    return decorator
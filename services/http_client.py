@@ -0,0 +1,401 @@
+# services/http_client.py
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import NewConnectionError
+
+from . import rate_limit
+from .streaming_body import StreamingJSONBody
+
+BRIA_API_HOST = "https://engine.prod.bria-api.com"
+
+# Max keep-alive connections kept open per host. Override with BRIA_HTTP_POOL_SIZE or configure().
+DEFAULT_POOL_SIZE = int(os.getenv("BRIA_HTTP_POOL_SIZE", "20"))
+# Max concurrent connections of the async client. With HTTP/2 many requests share one connection.
+DEFAULT_ASYNC_MAX_CONNECTIONS = int(os.getenv("BRIA_HTTP_ASYNC_MAX_CONNECTIONS", "100"))
+
+Timeout = Union[float, Tuple[float, float]]
+
+# Default (connect, read) timeouts per Bria endpoint path. The longest matching prefix wins.
+ENDPOINT_TIMEOUTS = {
+    "/v1/text-to-image/hd": (10, 120),
+    "/v1/gen_fill": (10, 120),
+    "/v1/image_expansion": (10, 120),
+    "/v1/background/replace": (10, 120),
+    "/v1/background/remove": (10, 60),
+    "/v1/background/blur": (10, 60),
+    "/v1/erase_foreground": (10, 60),
+    "/v1/product/packshot": (10, 120),
+    "/v1/product/shadow": (10, 120),
+    "/v1/product/lifestyle_shot_by_text": (10, 120),
+    "/v1/product/cutout": (10, 60),
+    "/v1/product/remove_background": (10, 60),
+    "/v1/prompt_enhancer": (10, 30),
+}
+DEFAULT_API_TIMEOUT = (10, 60)
+# Used for anything outside the Bria API host (result downloads, status probes).
+DOWNLOAD_TIMEOUT = (10, 120)
+
+# Methods that are safe to resend after a failure part-way through. Anything else (POST)
+# is only resent when the server cannot have acted on it.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"}
+# Statuses on which a non-idempotent request is resent, and only when they carry Retry-After.
+NON_IDEMPOTENT_RETRY_STATUSES = {429, 503}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+_async_max_connections = DEFAULT_ASYNC_MAX_CONNECTIONS
+# httpx.AsyncClient is bound to the event loop it was first used on, so keep one per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Return the process-wide keep-alive session, creating it on first use.
+
+    The underlying urllib3 pools are thread-safe, so the same session is shared by
+    every Streamlit script thread and worker thread in the process.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(_pool_size)
+    return _session
+
+
+def configure(pool_size: Optional[int] = None, async_max_connections: Optional[int] = None):
+    """
+    Reconfigure the shared client. Existing pooled connections are closed.
+
+    Args:
+        pool_size: Max keep-alive connections kept open per host.
+        async_max_connections: Max concurrent connections of the async client.
+            Applies to async clients created after this call.
+    """
+    global _session, _pool_size, _async_max_connections
+    with _session_lock:
+        if pool_size is not None:
+            _pool_size = max(1, int(pool_size))
+        if async_max_connections is not None:
+            _async_max_connections = max(1, int(async_max_connections))
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def endpoint_for(url: str) -> Optional[str]:
+    """
+    Return the known Bria endpoint path prefix a URL belongs to, "" for other paths
+    on the Bria API host, or None for URLs on any other host.
+    """
+    parsed = urlparse(url)
+    if f"{parsed.scheme}://{parsed.netloc}" != BRIA_API_HOST:
+        return None
+
+    best_match = ""
+    for prefix in ENDPOINT_TIMEOUTS:
+        if parsed.path.startswith(prefix) and len(prefix) > len(best_match):
+            best_match = prefix
+    return best_match
+
+
+def timeout_for(url: str) -> Timeout:
+    """Return the default (connect, read) timeout for a URL."""
+    endpoint = endpoint_for(url)
+    if endpoint is None:
+        return DOWNLOAD_TIMEOUT
+    return ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_API_TIMEOUT)
+
+
+class ConnectError(requests.exceptions.ConnectionError):
+    """The connection to the server could not be established; nothing was sent."""
+
+
+def _failed_to_connect(error: requests.exceptions.RequestException) -> bool:
+    """True when the request failed before reaching the server (connect timeout, DNS, refused)."""
+    if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectError)):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason says which phase failed.
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _next_retry_delay(method: str, url: str, attempt: int, response=None, error=None) -> Optional[float]:
+    """
+    Decide whether a Bria API call should be retried. Returns the delay in seconds,
+    or None when the response or error should be handed back to the caller.
+
+    Only throttling/5xx statuses and connection failures are retried. Read timeouts are
+    not, since the server may still be working on (and billing for) the request. For
+    non-idempotent methods (POST) a lost connection is only retried when it was never
+    established, and a status only when it is 429/503 with a Retry-After header.
+    """
+    if attempt >= rate_limit.MAX_RETRIES:
+        return None
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    if error is not None:
+        if not isinstance(error, requests.exceptions.ConnectionError):
+            return None
+        if not idempotent and not _failed_to_connect(error):
+            return None
+        delay = rate_limit.retry_delay(attempt)
+        reason = type(error).__name__
+    else:
+        if response.status_code not in rate_limit.RETRY_STATUSES:
+            return None
+        if not idempotent and (response.status_code not in NON_IDEMPOTENT_RETRY_STATUSES
+                               or "Retry-After" not in response.headers):
+            return None
+        delay = rate_limit.retry_delay(attempt, response.headers.get("Retry-After"))
+        if response.status_code == 429:
+            # Hold every caller of this endpoint, not just this one, to avoid a failure storm.
+            rate_limit.bucket_for(endpoint_for(url)).pause(delay)
+        reason = f"HTTP {response.status_code}"
+    print(f"{reason} from {method} {url}, retrying in {delay:.1f}s "
+          f"(attempt {attempt + 1}/{rate_limit.MAX_RETRIES})")
+    return delay
+
+
+def request(method: str, url: str, timeout: Optional[Timeout] = None, **kwargs) -> requests.Response:
+    """
+    Send a request through the shared session, applying the endpoint's default timeout.
+
+    Calls to the Bria API host also go through the endpoint's token bucket and are
+    retried with jittered exponential backoff on 429/5xx and connection errors (see
+    _next_retry_delay for what is retried for POST).
+    """
+    if timeout is None:
+        timeout = timeout_for(url)
+    endpoint = endpoint_for(url)
+    if endpoint is None:
+        return get_session().request(method, url, timeout=timeout, **kwargs)
+
+    bucket = rate_limit.bucket_for(endpoint)
+    attempt = 0
+    while True:
+        time.sleep(bucket.reserve())
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            delay = _next_retry_delay(method, url, attempt, error=e)
+            if delay is None:
+                raise
+        else:
+            delay = _next_retry_delay(method, url, attempt, response=response)
+            if delay is None:
+                return response
+            response.close()
+        time.sleep(delay)
+        attempt += 1
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return request("HEAD", url, **kwargs)
+
+
+# HEAD answers that say nothing about a GET: presigned S3 links are signed for GET only,
+# and some servers do not implement HEAD.
+HEAD_INCONCLUSIVE = (400, 403, 405, 501)
+
+
+def probe(url: str, **kwargs) -> requests.Response:
+    """
+    Check a URL without downloading it: a HEAD request, retried as a one-byte ranged GET
+    when HEAD is not allowed (HEAD_INCONCLUSIVE). The response is returned closed; an
+    available object answers 200, or 206 to the ranged GET.
+    """
+    response = head(url, allow_redirects=True, **kwargs)
+    if response.status_code in HEAD_INCONCLUSIVE:
+        response.close()
+        response = get(url, headers={"Range": "bytes=0-0"}, stream=True, **kwargs)
+    response.close()
+    return response
+
+
+def warm_up(host: str = BRIA_API_HOST, connections: int = 2) -> int:
+    """
+    Open keep-alive connections to a host ahead of the first real call so the
+    TCP+TLS handshake is not paid on the user's first request.
+
+    Args:
+        host: Base URL of the host to pre-connect to.
+        connections: Number of pooled connections to open in parallel.
+
+    Returns:
+        int: Number of connections that were established successfully.
+    """
+    connections = max(1, min(connections, _pool_size))
+
+    def _open(_):
+        try:
+            # Any HTTP status is fine here, we only want the socket in the pool.
+            get_session().head(host, timeout=(5, 5), allow_redirects=False).close()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"HTTP pool warm-up to {host} failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        return sum(executor.map(_open, range(connections)))
+
+
+def close():
+    """Close the shared session and all of its pooled connections."""
+    configure()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_async_client():
+    """
+    Return the httpx.AsyncClient for the running event loop, creating it on first use.
+
+    HTTP/2 is negotiated via ALPN when the `h2` package is installed, with a
+    transparent fallback to HTTP/1.1 for servers that do not offer it.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=_async_max_connections,
+                max_keepalive_connections=_pool_size,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _to_requests_response(response) -> requests.Response:
+    """Copy an httpx response into a requests.Response so callers share one error-handling path."""
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted._content = response.content
+    converted._content_consumed = True
+    converted.headers = CaseInsensitiveDict(response.headers)
+    converted.url = str(response.url)
+    converted.reason = response.reason_phrase
+    converted.encoding = response.encoding
+    return converted
+
+
+async def _asend(method: str, url: str, timeout: Timeout, **kwargs) -> requests.Response:
+    import httpx
+
+    if isinstance(timeout, tuple):
+        connect_timeout, read_timeout = timeout
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    # requests follows redirects for everything but HEAD by default, httpx never does.
+    follow_redirects = kwargs.pop("allow_redirects", method.upper() != "HEAD")
+    kwargs.pop("stream", None)
+
+    # httpx treats any sync iterable as a sync stream; hand it the async iterator instead.
+    body = kwargs.get("data")
+    if isinstance(body, StreamingJSONBody):
+        del kwargs["data"]
+        kwargs["content"] = body.aiter()
+        kwargs["headers"] = {**(kwargs.get("headers") or {}), "Content-Length": str(len(body))}
+
+    try:
+        response = await get_async_client().request(
+            method, url, timeout=timeout, follow_redirects=follow_redirects, **kwargs
+        )
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e)) from e
+    except httpx.ConnectError as e:
+        raise ConnectError(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.NetworkError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.exceptions.RequestException(str(e)) from e
+    return _to_requests_response(response)
+
+
+async def arequest(method: str, url: str, timeout: Optional[Timeout] = None, **kwargs) -> requests.Response:
+    """
+    Async counterpart of request(). Accepts the same keyword arguments as requests
+    (json, data, headers, params, allow_redirects) and returns a requests.Response,
+    raising the same requests.exceptions types on transport errors. Rate limiting
+    and retries behave exactly as in request().
+    """
+    if timeout is None:
+        timeout = timeout_for(url)
+    endpoint = endpoint_for(url)
+    if endpoint is None:
+        return await _asend(method, url, timeout, **kwargs)
+
+    bucket = rate_limit.bucket_for(endpoint)
+    attempt = 0
+    while True:
+        await asyncio.sleep(bucket.reserve())
+        try:
+            response = await _asend(method, url, timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            delay = _next_retry_delay(method, url, attempt, error=e)
+            if delay is None:
+                raise
+        else:
+            delay = _next_retry_delay(method, url, attempt, response=response)
+            if delay is None:
+                return response
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def apost(url: str, **kwargs) -> requests.Response:
+    return await arequest("POST", url, **kwargs)
+
+
+async def aget(url: str, **kwargs) -> requests.Response:
+    return await arequest("GET", url, **kwargs)
+
+
+async def ahead(url: str, **kwargs) -> requests.Response:
+    return await arequest("HEAD", url, **kwargs)
+
+
+async def aclose():
+    """Close the async client bound to the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,14 +1,8 @@
-import os
 import requests
 import json
-from dotenv import load_dotenv
 
-# Load environment variables.
-load_dotenv()
-BRIA_API_TOKEN = os.getenv("BRIA_API_KEY")
-
-if not BRIA_API_TOKEN:
-    print("Warning: BRIA_API_KEY not found. Please set it in your .env file for Bria.ai API calls.")
+from . import http_client, preflight
+from .settings import get_settings
 
 def _handle_bria_api_response(response: requests.Response, feature_name: str, input_url: str):
     """
@@ -67,6 +61,23 @@ def _handle_bria_api_response(response: requests.Response, feature_name: str, in
         raise RuntimeError(invalid_json_error) from json_err
 
 
+def _build_erase_foreground_request(image_url: str, preserve_alpha: bool = True, sync: bool = True):
+    api_token = get_settings().require_api_key()
+    preflight.check_url(image_url)  # Fails fast where the API would answer 460
+
+    endpoint = "https://engine.prod.bria-api.com/v1/erase_foreground"
+    headers = {
+        "Content-Type": "application/json",
+        "api_token": api_token
+    }
+    payload = {
+        "image_url": image_url,
+        "preserve_alpha": preserve_alpha,
+        "sync": sync
+    }
+    return endpoint, headers, payload
+
+
 def erase_foreground(image_url: str, preserve_alpha: bool = True, sync: bool = True) -> str:
     """
     Erases the foreground from an image using Bria.ai's /erase_foreground endpoint.
@@ -79,21 +90,17 @@ def erase_foreground(image_url: str, preserve_alpha: bool = True, sync: bool = T
     Returns:
         str: URL to the processed image with foreground erased (temporary URL).
     """
-    if not BRIA_API_TOKEN:
-        raise ValueError("Missing BRIA_API_KEY in .env file.")
-
-    endpoint = "https://engine.prod.bria-api.com/v1/erase_foreground"
-    headers = {
-        "Content-Type": "application/json",
-        "api_token": BRIA_API_TOKEN
-    }
-    payload = {
-        "image_url": image_url,
-        "preserve_alpha": preserve_alpha,
-        "sync": sync
-    }
+    endpoint, headers, payload = _build_erase_foreground_request(image_url, preserve_alpha, sync)
     print(f"Calling Bria.ai Erase Foreground for {image_url}")
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=60)
+    response = http_client.post(endpoint, headers=headers, json=payload)
+    return _handle_bria_api_response(response, "Erase Foreground", image_url)
+
+
+async def erase_foreground_async(image_url: str, preserve_alpha: bool = True, sync: bool = True) -> str:
+    """Async variant of erase_foreground. Takes the same arguments and returns the same result."""
+    endpoint, headers, payload = await preflight.arun(_build_erase_foreground_request, image_url, preserve_alpha, sync)
+    print(f"Calling Bria.ai Erase Foreground (async) for {image_url}")
+    response = await http_client.apost(endpoint, headers=headers, json=payload)
     return _handle_bria_api_response(response, "Erase Foreground", image_url)
 
 
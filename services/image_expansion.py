@@ -1,15 +1,10 @@
 # services/image_expansion.py.
 
-import os
 import requests
 import json
-from dotenv import load_dotenv
 
-load_dotenv()
-BRIA_API_TOKEN = os.getenv("BRIA_API_KEY")
-
-if not BRIA_API_TOKEN:
-    print("Warning: BRIA_API_KEY not found. Please set it in your .env file for Bria.ai API calls.")
+from . import http_client, preflight, result_cache
+from .settings import get_settings
 
 def _handle_bria_api_response(response: requests.Response, feature_name: str, input_url: str):
     """
@@ -76,48 +71,25 @@ def _handle_bria_api_response(response: requests.Response, feature_name: str, in
         raise RuntimeError(invalid_json_error) from json_err
 
 
-def expand_image(
+def _build_expand_image_request(
     image_url: str,
-    aspect_ratio: str = None, # e.g., "1:1", "16:9", or float like 0.5
-    canvas_size: list[int] = None, # [width, height], e.g., [1500, 1000]
-    original_image_size: list[int] = None, # [width, height]
-    original_image_location: list[int] = None, # [x, y]
+    aspect_ratio: str = None,
+    canvas_size: list[int] = None,
+    original_image_size: list[int] = None,
+    original_image_location: list[int] = None,
     prompt: str = None,
     seed: int = None,
     negative_prompt: str = None,
     preserve_alpha: bool = True,
     sync: bool = True,
     content_moderation: bool = False
-) -> str:
-    """
-    Expands an image using Bria.ai's /image_expansion endpoint.
-
-    Args:
-        image_url (str): The URL of the input image.
-        aspect_ratio (str or float, optional): Target aspect ratio ("1:1", "16:9", or float between 0.5-3.0).
-        canvas_size (list[int], optional): Desired output canvas dimensions [width, height].
-                                            Used if aspect_ratio is not provided.
-        original_image_size (list[int], optional): Desired size of the original image within the canvas.
-                                                   Required if aspect_ratio is not provided and canvas_size is used.
-        original_image_location (list[int], optional): Top-left corner position of the original image within canvas.
-                                                      Required if aspect_ratio is not provided and canvas_size is used.
-        prompt (str, optional): Text prompt to guide expansion.
-        seed (int, optional): Seed for predictable generation.
-        negative_prompt (str, optional): Negative prompt to avoid certain elements.
-        preserve_alpha (bool): Controls whether alpha channel values are retained.
-        sync (bool): Determines if the response is synchronous.
-        content_moderation (bool): Enables content moderation.
-
-    Returns:
-        str: URL to the expanded image (temporary URL).
-    """
-    if not BRIA_API_TOKEN:
-        raise ValueError("Missing BRIA_API_KEY in .env file.")
+):
+    api_token = get_settings().require_api_key()
 
     endpoint = "https://engine.prod.bria-api.com/v1/image_expansion"
     headers = {
         "Content-Type": "application/json",
-        "api_token": BRIA_API_TOKEN
+        "api_token": api_token
     }
     payload = {
         "image_url": image_url,
@@ -138,6 +110,9 @@ def expand_image(
         payload["canvas_size"] = canvas_size
         payload["original_image_size"] = original_image_size
         payload["original_image_location"] = original_image_location
+    # Geometry and the input's edges are checked here instead of by a 422 after the upload.
+    preflight.check_expansion(aspect_ratio, canvas_size, original_image_size, original_image_location)
+    preflight.check_expandable(image_url)
 
     if prompt:
         payload["prompt"] = prompt
@@ -146,11 +121,73 @@ def expand_image(
     if negative_prompt:
         payload["negative_prompt"] = negative_prompt
 
+    return endpoint, headers, payload
+
+
+@result_cache.cached("expand_image", when=result_cache.fixed_seed)
+def expand_image(
+    image_url: str,
+    aspect_ratio: str = None, # e.g., "1:1", "16:9", or float like 0.5
+    canvas_size: list[int] = None, # [width, height], e.g., [1500, 1000]
+    original_image_size: list[int] = None, # [width, height]
+    original_image_location: list[int] = None, # [x, y]
+    prompt: str = None,
+    seed: int = None,
+    negative_prompt: str = None,
+    preserve_alpha: bool = True,
+    sync: bool = True,
+    content_moderation: bool = False
+) -> str:
+    """
+    Expands an image using Bria.ai's /image_expansion endpoint.
+
+    Args:
+        image_url (str): The URL of the input image.
+        aspect_ratio (str or float, optional): Target aspect ratio ("1:1", "16:9", or float between 0.5-3.0).
+        canvas_size (list[int], optional): Desired output canvas dimensions [width, height].
+                                            Used if aspect_ratio is not provided.
+        original_image_size (list[int], optional): Desired size of the original image within the canvas.
+                                                   Required if aspect_ratio is not provided and canvas_size is used.
+        original_image_location (list[int], optional): Top-left corner position of the original image within canvas.
+                                                      Required if aspect_ratio is not provided and canvas_size is used.
+        prompt (str, optional): Text prompt to guide expansion.
+        seed (int, optional): Seed for predictable generation.
+        negative_prompt (str, optional): Negative prompt to avoid certain elements.
+        preserve_alpha (bool): Controls whether alpha channel values are retained.
+        sync (bool): Determines if the response is synchronous.
+        content_moderation (bool): Enables content moderation.
+
+    Returns:
+        str: URL to the expanded image (temporary URL).
+    """
+    endpoint, headers, payload = _build_expand_image_request(
+        image_url,
+        aspect_ratio=aspect_ratio,
+        canvas_size=canvas_size,
+        original_image_size=original_image_size,
+        original_image_location=original_image_location,
+        prompt=prompt,
+        seed=seed,
+        negative_prompt=negative_prompt,
+        preserve_alpha=preserve_alpha,
+        sync=sync,
+        content_moderation=content_moderation
+    )
+
     print(f"Calling Bria.ai Image Expansion for {image_url}")
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=120) # Increased timeout
+    response = http_client.post(endpoint, headers=headers, json=payload)
     return _handle_bria_api_response(response, "Image Expansion", image_url)
 
 
+async def expand_image_async(*args, **kwargs) -> str:
+    """Async variant of expand_image. Takes the same arguments and returns the same result."""
+    endpoint, headers, payload = await preflight.arun(_build_expand_image_request, *args, **kwargs)
+
+    print(f"Calling Bria.ai Image Expansion (async) for {payload['image_url']}")
+    response = await http_client.apost(endpoint, headers=headers, json=payload)
+    return _handle_bria_api_response(response, "Image Expansion", payload["image_url"])
+
+
 # Example usage (for testing this file directly)
 if __name__ == "__main__":
     test_image_url = "https://www.gstatic.com/webp/gallery/1.jpg" # Using a more reliable test URL
@@ -1,16 +1,10 @@
 # services/image_features.py
 
-import os
 import requests
 import json
-from dotenv import load_dotenv
 
-# Load environment variables.
-load_dotenv()
-BRIA_API_TOKEN = os.getenv("BRIA_API_KEY")
-
-if not BRIA_API_TOKEN:
-    print("Warning: BRIA_API_KEY not found. Please set it in your .env file for Bria.ai API calls.")
+from . import http_client, matte_cache, preflight
+from .settings import get_settings
 
 def _handle_bria_api_response(response: requests.Response, feature_name: str, input_url: str):
     """
@@ -71,6 +65,25 @@ def _handle_bria_api_response(response: requests.Response, feature_name: str, in
         raise RuntimeError(invalid_json_error) from json_err
 
 
+def _build_generate_background_request(image_url: str, bg_prompt: str, num_results: int = 1, sync: bool = True, fast: bool = True):
+    api_token = get_settings().require_api_key()
+    preflight.check_url(image_url)  # Fails fast where the API would answer 460
+
+    endpoint = "https://engine.prod.bria-api.com/v1/background/replace"
+    headers = {
+        "Content-Type": "application/json",
+        "api_token": api_token
+    }
+    payload = {
+        "image_url": image_url,
+        "bg_prompt": bg_prompt,
+        "num_results": num_results,
+        "sync": sync,
+        "fast": fast
+    }
+    return endpoint, headers, payload
+
+
 def generate_background(image_url: str, bg_prompt: str, num_results: int = 1, sync: bool = True, fast: bool = True) -> str:
     """
     Generates a new background for an image using Bria.ai's /background/replace endpoint.
@@ -85,24 +98,38 @@ def generate_background(image_url: str, bg_prompt: str, num_results: int = 1, sy
     Returns:
         str: URL to the processed image with new background (temporary URL).
     """
-    if not BRIA_API_TOKEN:
-        raise ValueError("Missing BRIA_API_KEY in .env file.")
+    endpoint, headers, payload = _build_generate_background_request(image_url, bg_prompt, num_results, sync, fast)
+    print(f"Calling Bria.ai Generate Background for {image_url} with prompt '{bg_prompt}'")
+    response = http_client.post(endpoint, headers=headers, json=payload)
+    return _handle_bria_api_response(response, "Generate Background", image_url)
 
-    endpoint = "https://engine.prod.bria-api.com/v1/background/replace"
+
+async def generate_background_async(image_url: str, bg_prompt: str, num_results: int = 1, sync: bool = True, fast: bool = True) -> str:
+    """Async variant of generate_background. Takes the same arguments and returns the same result."""
+    endpoint, headers, payload = await preflight.arun(
+        _build_generate_background_request, image_url, bg_prompt, num_results, sync, fast
+    )
+    print(f"Calling Bria.ai Generate Background (async) for {image_url} with prompt '{bg_prompt}'")
+    response = await http_client.apost(endpoint, headers=headers, json=payload)
+    return _handle_bria_api_response(response, "Generate Background", image_url)
+
+
+def _build_remove_image_background_request(image_url: str, preserve_partial_alpha: bool = True, sync: bool = True):
+    api_token = get_settings().require_api_key()
+    preflight.check_url(image_url)  # Fails fast where the API would answer 460
+
+    endpoint = "https://engine.prod.bria-api.com/v1/background/remove"
     headers = {
-        "Content-Type": "application/json",
-        "api_token": BRIA_API_TOKEN
+        "api_token": api_token
     }
-    payload = {
+    # For file uploads, use the 'files' parameter of http_client.post
+    # For image_url, it goes in 'data' for multipart/form-data
+    data = {
         "image_url": image_url,
-        "bg_prompt": bg_prompt,
-        "num_results": num_results,
-        "sync": sync,
-        "fast": fast
+        "preserve_partial_alpha": str(preserve_partial_alpha).lower(), # Booleans need to be strings "true"/"false" for multipart data
+        "sync": str(sync).lower()
     }
-    print(f"Calling Bria.ai Generate Background for {image_url} with prompt '{bg_prompt}'")
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=120)
-    return _handle_bria_api_response(response, "Generate Background", image_url)
+    return endpoint, headers, data
 
 
 def remove_image_background(image_url: str, preserve_partial_alpha: bool = True, sync: bool = True) -> str:
@@ -115,30 +142,56 @@ def remove_image_background(image_url: str, preserve_partial_alpha: bool = True,
         sync (bool): Determines if the response is synchronous.
 
     Returns:
-        str: URL to the processed image with background removed (temporary URL).
+        str: URL to the processed image with background removed (temporary URL); the URL of
+        an earlier call's cutout of this image when it is cached (see services.matte_cache).
     """
-    if not BRIA_API_TOKEN:
-        raise ValueError("Missing BRIA_API_KEY in .env file.")
+    cached = matte_cache.reusable_cutout_url(image_url=image_url)
+    if cached:
+        print(f"Using the cached cutout of {image_url}")
+        return cached
 
-    endpoint = "https://engine.prod.bria-api.com/v1/background/remove"
-    headers = {
-        "api_token": BRIA_API_TOKEN
-    }
-    # For file uploads, use 'files' parameter in requests.post
-    # For image_url, it goes in 'data' for multipart/form-data
-    data = {
-        "image_url": image_url,
-        "preserve_partial_alpha": str(preserve_partial_alpha).lower(), # Booleans need to be strings "true"/"false" for multipart data
-        "sync": str(sync).lower()
-    }
+    endpoint, headers, data = _build_remove_image_background_request(image_url, preserve_partial_alpha, sync)
 
     print(f"Calling Bria.ai Remove Background for {image_url}")
     # Note: Bria's docs show multipart/form-data for /background/remove,
-    # even when using image_url. requests.post handles this correctly with 'data'.
-    response = requests.post(endpoint, headers=headers, data=data, timeout=60) # Timeout adjusted
+    # even when using image_url. http_client.post (a requests session) handles this correctly with 'data'.
+    response = http_client.post(endpoint, headers=headers, data=data)
+    result_url = _handle_bria_api_response(response, "Remove Image Background", image_url)
+    if sync:
+        # Later tools on the same image can reuse this cutout (see services.matte_cache).
+        matte_cache.remember(matte_cache.source_key(image_url=image_url), result_url, "cutout")
+    return result_url
+
+
+async def remove_image_background_async(image_url: str, preserve_partial_alpha: bool = True, sync: bool = True) -> str:
+    """Async variant of remove_image_background. Takes the same arguments and returns the same result."""
+    endpoint, headers, data = await preflight.arun(
+        _build_remove_image_background_request, image_url, preserve_partial_alpha, sync
+    )
+
+    print(f"Calling Bria.ai Remove Background (async) for {image_url}")
+    response = await http_client.apost(endpoint, headers=headers, data=data)
     return _handle_bria_api_response(response, "Remove Image Background", image_url)
 
 
+def _build_blur_background_request(image_url: str, scale: int = 5, preserve_alpha: bool = True, sync: bool = True):
+    api_token = get_settings().require_api_key()
+    preflight.check_url(image_url)  # Fails fast where the API would answer 460
+
+    endpoint = "https://engine.prod.bria-api.com/v1/background/blur"
+    headers = {
+        "Content-Type": "application/json",
+        "api_token": api_token
+    }
+    payload = {
+        "image_url": image_url,
+        "scale": scale,
+        "preserve_alpha": preserve_alpha,
+        "sync": sync
+    }
+    return endpoint, headers, payload
+
+
 def blur_background(image_url: str, scale: int = 5, preserve_alpha: bool = True, sync: bool = True) -> str:
     """
     Applies a blur effect to the background of an image using Bria.ai's /background/blur endpoint.
@@ -152,22 +205,19 @@ def blur_background(image_url: str, scale: int = 5, preserve_alpha: bool = True,
     Returns:
         str: URL to the processed image with blurred background (temporary URL).
     """
-    if not BRIA_API_TOKEN:
-        raise ValueError("Missing BRIA_API_KEY in .env file.")
-
-    endpoint = "https://engine.prod.bria-api.com/v1/background/blur"
-    headers = {
-        "Content-Type": "application/json",
-        "api_token": BRIA_API_TOKEN
-    }
-    payload = {
-        "image_url": image_url,
-        "scale": scale,
-        "preserve_alpha": preserve_alpha,
-        "sync": sync
-    }
+    endpoint, headers, payload = _build_blur_background_request(image_url, scale, preserve_alpha, sync)
     print(f"Calling Bria.ai Blur Background for {image_url} with scale {scale}")
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=60) # Timeout adjusted
+    response = http_client.post(endpoint, headers=headers, json=payload)
+    return _handle_bria_api_response(response, "Blur Background", image_url)
+
+
+async def blur_background_async(image_url: str, scale: int = 5, preserve_alpha: bool = True, sync: bool = True) -> str:
+    """Async variant of blur_background. Takes the same arguments and returns the same result."""
+    endpoint, headers, payload = await preflight.arun(
+        _build_blur_background_request, image_url, scale, preserve_alpha, sync
+    )
+    print(f"Calling Bria.ai Blur Background (async) for {image_url} with scale {scale}")
+    response = await http_client.apost(endpoint, headers=headers, json=payload)
     return _handle_bria_api_response(response, "Blur Background", image_url)
 
 
@@ -0,0 +1,150 @@
+# services/image_filters.py
+#
+# Vectorized image filters. Colour-matrix filters (Sepia, Saturation) are one matrix
+# multiply per band of rows, point filters (High Contrast, Brightness) are 256-entry
+# lookup tables, and Vignette multiplies each band by a precomputed radial falloff.
+# Large images are processed in row bands so temporary float buffers stay small.
+
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Pixels per band: bounds the float32 temporaries to a few MB regardless of image size.
+BAND_PIXELS = 1 << 19
+
+# ITU-R BT.601 luma weights, the same ones PIL uses for convert("L").
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+SEPIA_MATRIX = np.array([
+    [0.393, 0.769, 0.189],
+    [0.349, 0.686, 0.168],
+    [0.272, 0.534, 0.131],
+], dtype=np.float32)
+
+
+def saturation_matrix(amount: float) -> np.ndarray:
+    """Colour matrix that scales saturation by `amount` (0 = grayscale, 1 = unchanged)."""
+    gray = np.tile(LUMA, (3, 1))
+    return (amount * np.eye(3, dtype=np.float32) + (1.0 - amount) * gray).astype(np.float32)
+
+
+def scale_lut(factor: float) -> np.ndarray:
+    """256-entry table mapping x to clip(round(x * factor)), rounding like Image.point does."""
+    return np.clip(np.rint(np.arange(256, dtype=np.float64) * factor), 0, 255).astype(np.uint8)
+
+
+def _split_alpha(img: Image.Image):
+    """Return (RGB image, alpha band or None), converting palette/gray modes as needed."""
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        return rgba.convert("RGB"), rgba.getchannel("A")
+    return (img if img.mode == "RGB" else img.convert("RGB")), None
+
+
+def _merge_alpha(rgb: Image.Image, alpha: Optional[Image.Image]) -> Image.Image:
+    if alpha is None:
+        return rgb
+    rgb.putalpha(alpha)
+    return rgb
+
+
+def _band_rows(width: int) -> int:
+    return max(1, BAND_PIXELS // max(1, width))
+
+
+def apply_color_matrix(img: Image.Image, matrix: np.ndarray) -> Image.Image:
+    """Apply a 3x3 colour matrix (out = matrix @ rgb) to every pixel; alpha is kept."""
+    rgb, alpha = _split_alpha(img)
+    pixels = np.asarray(rgb)
+    height, width, _ = pixels.shape
+    out = np.empty_like(pixels)
+    transform = np.ascontiguousarray(matrix.T, dtype=np.float32)
+    step = _band_rows(width)
+    for top in range(0, height, step):
+        band = pixels[top:top + step].reshape(-1, 3).astype(np.float32)
+        mixed = band @ transform
+        np.clip(mixed, 0, 255, out=mixed)
+        out[top:top + step] = mixed.reshape(-1, width, 3)
+    return _merge_alpha(Image.fromarray(out, "RGB"), alpha)
+
+
+def apply_lut(img: Image.Image, lut: np.ndarray) -> Image.Image:
+    """Map every colour channel through a 256-entry table; alpha is kept."""
+    rgb, alpha = _split_alpha(img)
+    # PIL applies the table in C; one copy per band of the RGB image.
+    table = np.asarray(lut, dtype=np.uint8).tolist() * 3
+    return _merge_alpha(rgb.point(table), alpha)
+
+
+def apply_vignette(img: Image.Image, strength: float = 0.5) -> Image.Image:
+    """Darken towards the corners: each pixel is scaled by 1 - strength * r^2, r = 1 at the corners."""
+    rgb, alpha = _split_alpha(img)
+    pixels = np.asarray(rgb)
+    height, width, _ = pixels.shape
+    out = np.empty_like(pixels)
+    xs = np.linspace(-1.0, 1.0, width, dtype=np.float32) ** 2 / 2
+    ys = np.linspace(-1.0, 1.0, height, dtype=np.float32) ** 2 / 2
+    step = _band_rows(width)
+    for top in range(0, height, step):
+        falloff = 1.0 - strength * (ys[top:top + step, None] + xs[None, :])
+        shaded = pixels[top:top + step] * falloff[:, :, None]
+        np.clip(shaded, 0, 255, out=shaded)
+        out[top:top + step] = shaded
+    return _merge_alpha(Image.fromarray(out, "RGB"), alpha)
+
+
+def _grayscale(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return img.convert("L")
+
+
+def _sepia(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return apply_color_matrix(img, SEPIA_MATRIX)
+
+
+def _high_contrast(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return apply_lut(img, scale_lut(1.5 if amount is None else amount))
+
+
+def _blur(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return img.filter(ImageFilter.BLUR)
+
+
+def _brightness(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return apply_lut(img, scale_lut(1.2 if amount is None else amount))
+
+
+def _saturation(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return apply_color_matrix(img, saturation_matrix(1.5 if amount is None else amount))
+
+
+def _vignette(img: Image.Image, amount: Optional[float]) -> Image.Image:
+    return apply_vignette(img, 0.5 if amount is None else amount)
+
+
+# Filter name -> fn(image, amount). `amount` is the filter's strength; None uses its default.
+FILTERS: Dict[str, Callable[[Image.Image, Optional[float]], Image.Image]] = {
+    "Grayscale": _grayscale,
+    "Sepia": _sepia,
+    "High Contrast": _high_contrast,
+    "Blur": _blur,
+    "Brightness": _brightness,
+    "Saturation": _saturation,
+    "Vignette": _vignette,
+}
+
+
+def apply_filter(img: Image.Image, filter_type: str, amount: Optional[float] = None) -> Image.Image:
+    """
+    Apply a named filter to a PIL image.
+
+    Args:
+        img: Source image (any mode; alpha is preserved except for Grayscale)
+        filter_type: One of FILTERS; unknown names return the image unchanged
+        amount: Filter strength, e.g. brightness factor or vignette strength (optional)
+
+    Returns:
+        Filtered PIL image
+    """
+    fn = FILTERS.get(filter_type)
+    return fn(img, amount) if fn is not None else img
@@ -0,0 +1,241 @@
+# services/mask_ops.py
+#
+# Vectorized operations on fill masks. Masks are 8-bit single-channel arrays or "L"
+# images, 255 = area to fill. Morphology uses running sums along one axis at a time
+# (square structuring element, cost independent of the radius), hole filling
+# propagates along whole row and column runs per step, and feathering is PIL's
+# Gaussian blur, so no operation loops over pixels in Python.
+
+import io
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from . import preflight
+
+MASK_THRESHOLD = 127
+
+MaskLike = Union[np.ndarray, Image.Image]
+
+
+def as_array(mask: MaskLike) -> np.ndarray:
+    """Return a mask as a 2-D uint8 array (RGB/RGBA images are reduced to luminance)."""
+    if isinstance(mask, Image.Image):
+        return np.asarray(mask if mask.mode == "L" else mask.convert("L"))
+    mask = np.asarray(mask)
+    if mask.ndim == 3:
+        return np.asarray(Image.fromarray(mask.astype(np.uint8)).convert("L"))
+    return mask if mask.dtype == np.uint8 else mask.astype(np.uint8)
+
+
+def to_image(mask: MaskLike) -> Image.Image:
+    return mask if isinstance(mask, Image.Image) and mask.mode == "L" else Image.fromarray(as_array(mask), "L")
+
+
+def to_png(mask: MaskLike) -> bytes:
+    buffer = io.BytesIO()
+    to_image(mask).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def binarize(mask: MaskLike, threshold: int = MASK_THRESHOLD) -> np.ndarray:
+    """0/255 mask of the pixels brighter than `threshold`."""
+    return np.where(as_array(mask) > threshold, np.uint8(255), np.uint8(0))
+
+
+def binarize_alpha(rgba: MaskLike, threshold: int = 0) -> np.ndarray:
+    """
+    0/255 mask of the pixels whose alpha exceeds `threshold`.
+
+    Used for canvas strokes: whatever the brush colour, a painted pixel has alpha > 0,
+    whereas a luminance conversion turns coloured strokes into partial grey masks.
+    """
+    if isinstance(rgba, Image.Image):
+        if "A" not in rgba.getbands():
+            return binarize(rgba)
+        alpha = np.asarray(rgba.getchannel("A"))
+    else:
+        rgba = np.asarray(rgba)
+        if rgba.ndim != 3 or rgba.shape[2] not in (2, 4):
+            return binarize(rgba)
+        alpha = rgba[:, :, -1]
+    return np.where(alpha > threshold, np.uint8(255), np.uint8(0))
+
+
+def invert(mask: MaskLike) -> np.ndarray:
+    return np.subtract(np.uint8(255), as_array(mask))
+
+
+def _window_count(selected: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """Number of selected pixels within `radius` along `axis`, via a running sum."""
+    size = selected.shape[axis]
+    padding = [(0, 0), (0, 0)]
+    padding[axis] = (radius + 1, radius)
+    sums = np.cumsum(np.pad(selected, padding), axis=axis, dtype=np.int32)
+    upper = [slice(None), slice(None)]
+    lower = [slice(None), slice(None)]
+    upper[axis] = slice(2 * radius + 1, None)
+    lower[axis] = slice(0, size)
+    return sums[tuple(upper)] - sums[tuple(lower)]
+
+
+def dilate(mask: MaskLike, radius: int) -> np.ndarray:
+    """Grow the selection by `radius` px (square structuring element)."""
+    selected = as_array(mask) > MASK_THRESHOLD
+    if radius > 0:
+        for axis in (0, 1):
+            selected = _window_count(selected, radius, axis) > 0
+    return np.where(selected, np.uint8(255), np.uint8(0))
+
+
+def erode(mask: MaskLike, radius: int) -> np.ndarray:
+    """Shrink the selection by `radius` px; pixels beyond the border count as unselected."""
+    selected = as_array(mask) > MASK_THRESHOLD
+    if radius > 0:
+        for axis in (0, 1):
+            selected = _window_count(selected, radius, axis) == 2 * radius + 1
+    return np.where(selected, np.uint8(255), np.uint8(0))
+
+
+def grow(mask: MaskLike, pixels: int) -> np.ndarray:
+    """Dilate for positive `pixels`, erode for negative ones."""
+    return dilate(mask, pixels) if pixels >= 0 else erode(mask, -pixels)
+
+
+def _spread_along_rows(marker: np.ndarray, region: np.ndarray) -> np.ndarray:
+    """Extend `marker` to every run of `region` pixels (within a row) that it touches."""
+    height, width = region.shape
+    flat = region.ravel()
+    starts = flat.copy()
+    starts[1:] &= ~flat[:-1]
+    starts[::width] = flat[::width]  # Runs never continue across rows.
+    run_ids = np.cumsum(starts, dtype=np.int32)
+    run_ids *= flat
+    touched = np.zeros(int(run_ids[-1]) + 1 if run_ids.size else 1, dtype=bool)
+    touched[run_ids[marker.ravel() & flat]] = True
+    touched[0] = False
+    return touched[run_ids].reshape(height, width)
+
+
+def fill_holes(mask: MaskLike) -> np.ndarray:
+    """
+    Select enclosed gaps: unselected areas that cannot be reached from the image border.
+
+    The reachable background is found by alternately spreading along row runs and
+    column runs until nothing changes, which takes one step per turn of the longest
+    path rather than one per pixel.
+    """
+    selected = as_array(mask) > MASK_THRESHOLD
+    background = ~selected
+    reached = np.zeros_like(background)
+    reached[[0, -1], :] = background[[0, -1], :]
+    reached[:, [0, -1]] |= background[:, [0, -1]]
+    count = -1
+    while True:
+        reached = _spread_along_rows(reached, background)
+        reached = _spread_along_rows(reached.T, background.T).T
+        new_count = int(np.count_nonzero(reached))
+        if new_count == count:
+            break
+        count = new_count
+    return np.where(selected | (background & ~reached), np.uint8(255), np.uint8(0))
+
+
+def feather(mask: MaskLike, radius: float) -> np.ndarray:
+    """Soften the selection edge with a Gaussian blur of `radius` px."""
+    image = to_image(mask)
+    if radius <= 0:
+        return np.asarray(image)
+    return np.asarray(image.filter(ImageFilter.GaussianBlur(radius)))
+
+
+def resize(mask: MaskLike, size: Tuple[int, int], threshold: Optional[int] = MASK_THRESHOLD) -> np.ndarray:
+    """
+    Scale a mask to `size` (width, height), e.g. from canvas to source resolution.
+
+    Interpolates bilinearly, then re-thresholds so an upscaled mask gets smooth edges
+    instead of blocky nearest-neighbour steps; pass threshold=None to keep it soft.
+    """
+    image = to_image(mask)
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), Image.BILINEAR)
+    return binarize(image, threshold) if threshold is not None else np.asarray(image)
+
+
+def from_canvas(
+    canvas_rgba: np.ndarray,
+    size: Optional[Tuple[int, int]] = None,
+    grow_px: int = 0,
+    fill_gaps: bool = False,
+    inverted: bool = False
+) -> np.ndarray:
+    """
+    Turn drawing-canvas strokes into a binary fill mask at the source image's resolution.
+    Soft edges are not part of the API mask; roi_fill blends its patches with one.
+
+    Args:
+        canvas_rgba: RGBA stroke layer from the drawing canvas (height x width x 4)
+        size: Source image (width, height); the canvas is usually a downscaled preview
+        grow_px: Grow (positive) or shrink (negative) the selection, in canvas pixels
+        fill_gaps: Also select areas enclosed by strokes
+        inverted: Fill everything except the strokes
+
+    Returns:
+        uint8 mask, 255 = area to fill
+    """
+    mask = binarize_alpha(canvas_rgba)
+    if fill_gaps:
+        mask = fill_holes(mask)
+    if grow_px:
+        mask = grow(mask, grow_px)
+    if inverted:
+        mask = invert(mask)
+
+    if size is not None and tuple(size) != (mask.shape[1], mask.shape[0]):
+        mask = resize(mask, size)
+    return mask
+
+
+def open_encoded(data) -> Image.Image:
+    """Open bytes-like data or a seekable binary file without copying it or moving its position."""
+    return Image.open(preflight.stream(data))
+
+
+def _is_binary(mask: Image.Image) -> bool:
+    histogram = mask.histogram()
+    return not any(histogram[1:255])
+
+
+def conform(mask_data, image_data=None, image_size: Optional[Tuple[int, int]] = None):
+    """
+    Make an encoded mask usable as the API mask for an encoded image.
+
+    RGBA masks (e.g. exported strokes) are binarized by alpha, colour masks by
+    luminance, and masks of another size are scaled to the image's resolution. A
+    binary mask (only 0 and 255) that already matches is returned as is, without
+    re-encoding; grey levels (e.g. a feathered edge) are thresholded.
+
+    Args:
+        mask_data: Encoded mask as bytes-like or a seekable binary file object
+        image_data: The encoded image the mask applies to (only its header is read)
+        image_size: The image's (width, height) if already known, e.g. from preflight.check_image
+
+    Returns:
+        The original `mask_data`, or PNG bytes of the corrected mask
+    """
+    if image_size is None:
+        image_size = open_encoded(image_data).size
+    image_size = tuple(image_size)
+    mask = open_encoded(mask_data)
+    if mask.size == image_size and (mask.mode == "1" or (mask.mode == "L" and _is_binary(mask))):
+        return mask_data
+    if "A" in mask.getbands() or (mask.mode == "P" and "transparency" in mask.info):
+        rgba = mask.convert("RGBA")
+        # A fully opaque RGBA mask carries its selection in the colour channels instead.
+        opaque = np.asarray(rgba.getchannel("A")).min() == 255
+        array = binarize(rgba) if opaque else binarize_alpha(rgba)
+    else:
+        array = binarize(mask)
+    print(f"[mask_ops] Conformed {mask.mode} {mask.size[0]}x{mask.size[1]} mask to {image_size[0]}x{image_size[1]}")
+    return to_png(resize(array, image_size))
@@ -0,0 +1,144 @@
+# services/matte_cache.py
+#
+# Cutouts (the product with its background removed, as RGBA) remembered per source
+# image. Sources are keyed by the SHA-256 of their bytes, or by their URL without
+# signing parameters, so a cutout produced once can be reused locally instead of
+# asking the API to segment the same photo again. Files live in the asset store; a
+# small SQLite-backed memo maps source keys to them.
+#
+# Producers (product_cutout, remove_background, remove_image_background and transparent
+# packshots) record their cutouts; consumers (packshot, shadow, lifestyle) upload the
+# cached RGBA cutout instead of the raw photo, and the background removal calls return
+# it directly, so segmentation runs once per product photo. Turn reuse off with
+# disable() or BRIA_REUSE_MATTES=0.
+
+import os
+import threading
+from typing import Optional, Sequence, Tuple
+
+from . import asset_store, result_cache
+from .memo import TTLMemo
+
+# What a stored matte is:
+#   "packshot" - a /product/packshot result on a transparent background (centred and padded)
+#   "cutout"   - the source photo with its background removed, same framing as the source
+KINDS = ("packshot", "cutout")
+
+_memo: Optional[TTLMemo] = None
+_memo_lock = threading.Lock()
+_reuse = os.getenv("BRIA_REUSE_MATTES", "1").lower() not in ("0", "false", "no")
+
+
+def enable():
+    """Let service functions reuse cached cutouts instead of segmenting the same photo again."""
+    global _reuse
+    _reuse = True
+
+
+def disable():
+    global _reuse
+    _reuse = False
+
+
+def is_enabled() -> bool:
+    return _reuse
+
+
+def _index() -> TTLMemo:
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                store = asset_store.get_store()
+                # Entries live as long as the asset store keeps unused files.
+                _memo = TTLMemo(max_entries=4096, ttl_seconds=store.max_age_seconds,
+                                db_path=os.path.join(store.directory, "mattes.sqlite3"))
+    return _memo
+
+
+def hash_key(content_hash: str) -> str:
+    """Key of a source image whose SHA-256 (result_cache.hash_stream) is already known."""
+    return "sha256:" + content_hash
+
+
+def source_key(image_data=None, image_url: Optional[str] = None) -> Optional[str]:
+    """Key of a source image given as bytes (or a seekable file) or as a URL; None if neither."""
+    if image_data is not None and (not hasattr(image_data, "__len__") or len(image_data)):
+        return hash_key(result_cache.hash_stream(image_data))
+    if image_url:
+        return "url:" + asset_store.asset_key(image_url)
+    return None
+
+
+def remember(key: Optional[str], cutout, kind: str = "cutout") -> Optional[str]:
+    """
+    Record the cutout produced for a source. `cutout` is a result URL, a local path or
+    PNG bytes. URLs are not downloaded here; lookup() resolves them through the asset
+    store, which already holds any result the app has displayed. Returns what was
+    recorded (URL or path), or None; failures are only logged since the cache is an
+    optimization.
+    """
+    if key is None or not cutout:
+        return None
+    if isinstance(cutout, (bytes, bytearray, memoryview)):
+        try:
+            cutout = asset_store.get_store().put(bytes(cutout), ".png")
+        except OSError as e:
+            print(f"[matte_cache] Not caching {kind} for {key[:20]}: {e}")
+            return None
+    _index().set(f"{kind}:{key}", cutout)
+    print(f"[matte_cache] Stored {kind} for {key[:20]}")
+    return cutout
+
+
+def _find(key: Optional[str], kinds: Sequence[str], urls_only: bool = False) -> Optional[Tuple[str, str]]:
+    """(recorded location, local path) of the first available matte of `kinds`; None on a miss."""
+    if key is None:
+        return None
+    for kind in kinds:
+        location = _index().get(f"{kind}:{key}")
+        if not location or (urls_only and not location.startswith(("http://", "https://"))):
+            continue
+        try:
+            return location, asset_store.get_store().get_path(location)
+        except Exception as e:
+            # Evicted locally and the link has expired: treat as a miss.
+            print(f"[matte_cache] Cached {kind} for {key[:20]} is gone: {e}")
+    return None
+
+
+def lookup(key: Optional[str], kinds: Sequence[str] = KINDS) -> Optional[str]:
+    """Local path of a cached matte for a source, trying `kinds` in order; None on a miss."""
+    found = _find(key, kinds)
+    return found[1] if found else None
+
+
+def reusable_cutout(image_data=None, image_url: Optional[str] = None, kinds: Sequence[str] = ("cutout",)) -> Optional[str]:
+    """Path of a cached cutout a service may use in place of segmenting the source, if reuse is on."""
+    if not _reuse:
+        return None
+    return lookup(source_key(image_data, image_url), kinds)
+
+
+def reusable_cutout_url(image_data=None, image_url: Optional[str] = None,
+                        kinds: Sequence[str] = ("cutout",)) -> Optional[str]:
+    """
+    Result URL of a cached cutout, for services that return URLs, if reuse is on. The
+    asset store keeps serving its stored copy after the link expires. None for cutouts
+    made locally, which have no URL.
+    """
+    if not _reuse:
+        return None
+    found = _find(source_key(image_data, image_url), kinds, urls_only=True)
+    return found[0] if found else None
+
+
+def cutout_for_upload(image_data=None, image_url: Optional[str] = None, kinds: Sequence[str] = KINDS) -> Optional[bytes]:
+    """PNG bytes of a cached cutout to upload instead of the source image, or None."""
+    path = reusable_cutout(image_data, image_url, kinds)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    print(f"[matte_cache] Uploading the cached cutout instead of the source ({len(data) / 1e6:.1f} MB)")
+    return data
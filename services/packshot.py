@@ -1,6 +1,7 @@
-from typing import Dict, Any
-import requests
-import base64
+from typing import Dict, Any, Optional
+
+from . import http_client, preflight, upload_optimizer
+from .streaming_body import Base64Field, StreamingJSONBody
 
 def create_packshot(
     api_key: str,
@@ -8,18 +9,20 @@ def create_packshot(
     background_color: str = "#FFFFFF",
     sku: str = None,
     force_rmbg: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
 ) -> Dict[str, Any]:
     """
     Create a professional packshot from a product image.
     
     Args:
         api_key: Bria AI API key
-        image_data: Image data in bytes
+        image_data: Image data in bytes (or a seekable binary file object)
         background_color: Background color in hex format or 'transparent'
         sku: Optional SKU identifier for the product
         force_rmbg: Whether to force background removal even if alpha channel exists
         content_moderation: Whether to enable content moderation
+        optimize_uploads: Shrink the upload first (see services.upload_optimizer); None uses the default
     
     Returns:
         Dict containing the API response
@@ -32,12 +35,12 @@ def create_packshot(
         'Content-Type': 'application/json'
     }
     
-    # Convert image data to base64.
-    image_base64 = base64.b64encode(image_data).decode('utf-8')
-    
-    # Prepare request data
+    preflight.check_image(image_data)
+
+    # Prepare request data; the image is base64-encoded while the body is sent.
     data = {
-        'file': image_base64,
+        'file': Base64Field(upload_optimizer.prepare_upload(image_data, "/v1/product/packshot",
+                                                            enabled=optimize_uploads)),
         'background_color': background_color,
         'force_rmbg': force_rmbg,
         'content_moderation': content_moderation
@@ -52,7 +55,7 @@ def create_packshot(
         print(f"Headers: {headers}")
         print(f"Data keys: {list(data.keys())}")
         
-        response = requests.post(url, headers=headers, json=data)
+        response = http_client.post(url, headers=headers, data=StreamingJSONBody(data))
         response.raise_for_status()
         
         print(f"Response status: {response.status_code}")
@@ -0,0 +1,115 @@
+# services/packshot_recolor.py
+#
+# Packshot colourways rendered locally. The first request for a product makes one
+# /product/packshot call on a transparent background (or reuses a cutout already in
+# the matte cache); every background colour after that, including a whole palette, is
+# an alpha blend of that cutout onto a solid canvas and needs no API call.
+
+import io
+from typing import Any, Dict, Iterable, Optional
+
+from PIL import Image
+
+from . import asset_store, compositing, matte_cache
+from .product_service import create_product_packshot
+
+
+def recolor(cutout: Image.Image, background_color: Optional[str]) -> Image.Image:
+    """
+    Put a transparent packshot on a solid background.
+
+    Args:
+        cutout: RGBA packshot or cutout
+        background_color: Hex colour, or None / "transparent" to keep the transparency
+
+    Returns:
+        RGB image on the colour, or the RGBA cutout itself for a transparent background
+    """
+    cutout = cutout.convert("RGBA")
+    if background_color in (None, "", "transparent"):
+        return cutout
+    return compositing.finish(compositing.over(compositing.background(cutout.size, background_color), cutout),
+                              transparent=False)
+
+
+def render_palette(cutout: Image.Image, colors: Iterable[Optional[str]]) -> Dict[str, Image.Image]:
+    """recolor() for every colour in a palette; keys are the colours ("transparent" for None)."""
+    cutout = cutout.convert("RGBA")
+    return {color or "transparent": recolor(cutout, color) for color in colors}
+
+
+def packshot_cutout(
+    api_key: str,
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    force_rmbg: bool = False,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+) -> Dict[str, Any]:
+    """
+    Local path of the transparent packshot for an image, making at most one API call.
+
+    A cached packshot for the same source is used unless `force_rmbg` is set (a
+    cutout is not used: its framing differs from a packshot's). Otherwise
+    /product/packshot is called once with a transparent background and the result
+    is cached.
+
+    Returns:
+        Dict with "path" (RGBA PNG) and "remote_calls" (0 or 1), or {"error": ...}
+    """
+    key = matte_cache.source_key(image_bytes, image_url)
+    cached = None if force_rmbg else matte_cache.lookup(key, kinds=("packshot",))
+    if cached:
+        return {"path": cached, "remote_calls": 0}
+
+    result = create_product_packshot(
+        api_key=api_key,
+        image_bytes=image_bytes,
+        image_url=image_url,
+        sku=sku,
+        background_color="transparent",
+        force_rmbg=force_rmbg,
+        content_moderation=content_moderation,
+        optimize_uploads=optimize_uploads
+    )
+    if not result or "result_url" not in result:
+        return {"error": (result or {}).get("error", f"Unexpected API response: {result}")}
+    path = matte_cache.lookup(key, kinds=("packshot",)) or asset_store.get_store().get_path(result["result_url"])
+    return {"path": path, "remote_calls": 1}
+
+
+def create_packshot_colorways(
+    api_key: str,
+    colors: Iterable[Optional[str]],
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    force_rmbg: bool = False,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+) -> Dict[str, Any]:
+    """
+    Packshots of one product on several background colours, from a single remote call.
+
+    Args:
+        api_key: Bria AI API key
+        colors: Hex background colours; None or "transparent" for a transparent result
+        image_bytes / image_url: The product image
+        sku, force_rmbg, content_moderation, optimize_uploads: As for create_product_packshot
+
+    Returns:
+        Dict with "results" (colour -> local image path), "cutout" (path of the
+        transparent packshot) and "remote_calls", or {"error": ...}
+    """
+    cutout = packshot_cutout(api_key, image_bytes, image_url, sku, force_rmbg, content_moderation, optimize_uploads)
+    if "error" in cutout:
+        return cutout
+
+    store = asset_store.get_store()
+    results = {}
+    for color, img in render_palette(Image.open(cutout["path"]), colors).items():
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", compress_level=1)  # Fast to write; these stay local
+        results[color] = store.put(buffer.getvalue(), ".png")
+    return {"results": results, "cutout": cutout["path"], "remote_calls": cutout["remote_calls"]}
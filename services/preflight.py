@@ -0,0 +1,332 @@
+# services/preflight.py
+#
+# Local checks run before a request is sent. Inputs the API would reject (an image it
+# cannot decode, a URL it cannot download (460), transparent pixels along the edge of an
+# image to expand (422), a canvas the original does not fit on) are otherwise only
+# reported after the upload and up to two minutes of waiting; here they fail in
+# milliseconds with a PreflightError. PreflightError is a ValueError, so every service
+# reports it the way it already reports bad arguments.
+#
+# Image data is decoded from memory, URLs get a HEAD request (results cached briefly).
+# Turn all checks off with disable() or BRIA_PREFLIGHT=0, only the URL checks with
+# BRIA_PREFLIGHT_URLS=0.
+
+import asyncio
+import io
+import os
+from typing import TYPE_CHECKING, Optional, Sequence, Tuple
+
+import requests
+
+from . import asset_store, http_client
+from .memo import TTLMemo
+
+# numpy and PIL are imported by the checks that use them, so importing this module (the
+# services do at startup) does not load them before the app's first paint.
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Formats the API accepts (MPO is how Pillow reports many phone JPEGs).
+ACCEPTED_FORMATS = ("JPEG", "MPO", "PNG", "WEBP")
+ACCEPTED_CONTENT_TYPES = ("image/jpeg", "image/jpg", "image/pjpeg", "image/png", "image/webp")
+# Client-side dimension limits; larger images are refused before anything is decoded.
+MIN_SIDE = int(os.getenv("BRIA_PREFLIGHT_MIN_SIDE", "32"))
+MAX_PIXELS = int(float(os.getenv("BRIA_PREFLIGHT_MAX_MEGAPIXELS", "64")) * 1_000_000)
+# image_expansion limits (also the bounds of the app's inputs).
+MAX_CANVAS_SIDE = 5000
+ASPECT_RATIO_RANGE = (0.5, 3.0)
+# Grey level above which a mask pixel counts as selected (mask_ops.MASK_THRESHOLD).
+MASK_THRESHOLD = 127
+
+HEAD_TIMEOUT = (3, 5)
+# A URL that answered recently is not probed again for this long.
+REACHABLE_TTL_SECONDS = 300
+
+_enabled = os.getenv("BRIA_PREFLIGHT", "1").lower() not in ("0", "false", "no")
+_check_urls = os.getenv("BRIA_PREFLIGHT_URLS", "1").lower() not in ("0", "false", "no")
+_reachable = TTLMemo(max_entries=1024, ttl_seconds=REACHABLE_TTL_SECONDS)
+
+
+class PreflightError(ValueError):
+    """An input the API would reject, found before the request was sent."""
+
+
+def enable(check_urls: bool = True):
+    """Run the preflight checks (URL reachability too, unless `check_urls` is False)."""
+    global _enabled, _check_urls
+    _enabled, _check_urls = True, check_urls
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _BufferReader(io.RawIOBase):
+    """Read-only seekable file over a buffer; each read copies only the bytes asked for."""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._view)}[whence]
+        self._position = max(0, start + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+def stream(data) -> io.RawIOBase:
+    """
+    Seekable binary stream over bytes-like data or a binary file, for Image.open. Buffers
+    (including the upload's getbuffer() view and in-memory files) are read in place
+    rather than copied; other files are read once, leaving their position unchanged.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return _BufferReader(data)
+    if hasattr(data, "getbuffer"):
+        return _BufferReader(data.getbuffer())
+    start = data.tell()
+    content = data.read()
+    data.seek(start)
+    return _BufferReader(content)
+
+
+def _size(source: io.RawIOBase) -> int:
+    size = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    return size
+
+
+def _checked_size(data, label: str, formats: Sequence[str]) -> Tuple[int, int]:
+    """Run open_image()'s checks, decoding the data once; returns the image's (width, height)."""
+    from PIL import Image
+
+    source = stream(data)
+    if not _size(source):
+        raise PreflightError(f"The {label} is empty.")
+    try:
+        img = Image.open(source)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise PreflightError(f"The {label} is not a readable image: {e}") from e
+
+    if img.format not in formats:
+        raise PreflightError(f"The {label} is {img.format or 'of an unknown format'}; "
+                             f"use {', '.join(f for f in formats if f != 'MPO')}.")
+    width, height = img.size
+    if min(width, height) < MIN_SIDE:
+        raise PreflightError(f"The {label} is {width}x{height} px; both sides must be at least {MIN_SIDE} px.")
+    if width * height > MAX_PIXELS:
+        raise PreflightError(f"The {label} is {width}x{height} px ({width * height / 1e6:.0f} MP); "
+                             f"the limit is {MAX_PIXELS / 1e6:.0f} MP.")
+
+    try:
+        if img.format == "PNG":
+            img.verify()  # Checks every chunk's CRC without decompressing
+        else:
+            img.draft("RGB", (max(1, width // 8), max(1, height // 8)))  # No-op for non-JPEGs
+            img.load()
+    except (OSError, SyntaxError, ValueError) as e:
+        raise PreflightError(f"The {label} is damaged or truncated: {e}") from e
+    return width, height
+
+
+def open_image(data, label: str = "image", formats: Sequence[str] = ACCEPTED_FORMATS) -> "Image.Image":
+    """
+    Open encoded image data and check that it can be sent.
+
+    The format and dimensions are checked from the header, then the pixel data is
+    decoded (JPEGs at 1/8 scale, PNGs verified by their chunk checksums) so truncated
+    or corrupt files are caught too. The data is read in place, not copied.
+
+    Args:
+        data: Encoded image as bytes-like or a seekable binary file object
+        label: Name of the input in error messages
+        formats: Accepted Pillow format names
+
+    Returns:
+        The opened image, ready for further reads
+
+    Raises:
+        PreflightError: if the data is empty, undecodable, of another format or out of bounds
+    """
+    from PIL import Image
+
+    _checked_size(data, label, formats)
+    # verify() and draft() leave the checked image unusable for full-size reads.
+    return Image.open(stream(data))
+
+
+def check_image(data, label: str = "image") -> Optional[Tuple[int, int]]:
+    """
+    open_image()'s checks only, without reopening the image. Returns its (width, height)
+    for later steps to reuse, or None when preflight is disabled.
+    """
+    if _enabled and data is not None:
+        return _checked_size(data, label, ACCEPTED_FORMATS)
+    return None
+
+
+def transparent_edges(img: "Image.Image") -> Sequence[str]:
+    """Edges ("top", "bottom", "left", "right") with at least one fully transparent pixel."""
+    import numpy as np
+
+    if img.mode not in ("RGBA", "LA", "PA") and "transparency" not in img.info:
+        return ()
+    width, height = img.size
+    # Only the one-pixel border strips are converted; their alphas are then scanned in one pass.
+    boxes = ((0, 0, width, 1), (0, height - 1, width, height), (0, 0, 1, height), (width - 1, 0, width, height))
+    strips = [np.asarray(img.crop(box).convert("RGBA").getchannel("A")).ravel() for box in boxes]
+    transparent = np.concatenate(strips) == 0
+    hits = np.logical_or.reduceat(transparent, np.cumsum([0] + [len(s) for s in strips[:-1]]))
+    return tuple(name for name, hit in zip(("top", "bottom", "left", "right"), hits) if hit)
+
+
+def check_opaque_edges(img: "Image.Image", label: str = "image"):
+    """Raise PreflightError if any edge pixel is fully transparent (image_expansion's 422)."""
+    edges = transparent_edges(img)
+    if edges:
+        raise PreflightError(f"The {label} has fully transparent pixels along its {', '.join(edges)} "
+                             f"edge(s); image expansion needs opaque edges. Crop or flatten it first.")
+
+
+def check_mask(mask_data, label: str = "mask", threshold: int = MASK_THRESHOLD):
+    """Raise PreflightError if the mask cannot be read or selects no pixels (nothing to fill)."""
+    if not _enabled:
+        return
+    mask = open_image(mask_data, label).convert("L")
+    if mask.getextrema()[1] <= threshold:
+        raise PreflightError(f"The {label} is empty; paint the area to fill in white.")
+
+
+def check_url(url: str, label: str = "image_url") -> Optional[str]:
+    """
+    Check that the API will be able to download an input URL (its 460 error).
+
+    Sends a HEAD request (a one-byte GET where HEAD is not allowed), so nothing is
+    downloaded. Connection failures and 4xx/5xx answers fail; so do links to web
+    pages or to an unsupported image type. Answers are cached for a few minutes.
+
+    Returns:
+        The URL's content type ("" if it sent none), or None when the check was skipped
+
+    Raises:
+        PreflightError: if the URL is malformed, unreachable or not a supported image
+    """
+    if not (_enabled and _check_urls):
+        return None
+    if not isinstance(url, str) or not url.lower().startswith(("http://", "https://")):
+        raise PreflightError(f"The {label} must be a public http(s) URL, got {url!r}.")
+    content_type = _reachable.get(url)
+    if content_type is not None:
+        return content_type
+
+    try:
+        response = http_client.probe(url, timeout=HEAD_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        raise PreflightError(f"The {label} {url} could not be reached: {type(e).__name__}.") from e
+    if response.status_code >= 400:
+        raise PreflightError(f"The {label} {url} answered HTTP {response.status_code}; "
+                             f"it must be publicly downloadable.")
+
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type.startswith("text/"):
+        raise PreflightError(f"The {label} {url} is a web page ({content_type}), not an image; "
+                             f"use the image's own address.")
+    if content_type.startswith("image/") and content_type not in ACCEPTED_CONTENT_TYPES:
+        raise PreflightError(f"The {label} {url} is {content_type}; use JPEG, PNG or WEBP.")
+    _reachable.set(url, content_type)
+    return content_type
+
+
+def check_expandable(image_url: str, label: str = "image_url"):
+    """
+    check_url() plus the edge scan image expansion needs. JPEGs have no alpha and are
+    not downloaded; anything else is fetched through the asset store and scanned.
+    """
+    content_type = check_url(image_url, label)
+    if content_type is None or content_type in ("image/jpeg", "image/jpg", "image/pjpeg"):
+        return
+    try:
+        data = asset_store.get_store().get_bytes(image_url)
+    except (requests.exceptions.RequestException, OSError) as e:
+        print(f"[preflight] Could not fetch {image_url} to scan its edges: {e}")
+        return
+    check_opaque_edges(open_image(data, label), label)
+
+
+def _pair(value, name: str, positive: bool = True):
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise PreflightError(f"'{name}' must be [width, height] or [x, y], got {value!r}.")
+    try:
+        a, b = (int(v) for v in value)
+    except (TypeError, ValueError):
+        raise PreflightError(f"'{name}' must contain integers, got {value!r}.") from None
+    if positive and (a <= 0 or b <= 0):
+        raise PreflightError(f"'{name}' must be positive, got {value!r}.")
+    return a, b
+
+
+def aspect_ratio_value(aspect_ratio) -> float:
+    """Width / height of an aspect ratio given as "W:H" or as a number."""
+    try:
+        if isinstance(aspect_ratio, str) and ":" in aspect_ratio:
+            width, height = (float(v) for v in aspect_ratio.split(":"))
+            return width / height
+        return float(aspect_ratio)
+    except (TypeError, ValueError, ZeroDivisionError):
+        raise PreflightError(f"Invalid aspect ratio {aspect_ratio!r}; use \"W:H\" or a number.") from None
+
+
+def check_expansion(aspect_ratio=None, canvas_size=None, original_image_size=None, original_image_location=None):
+    """
+    Check image_expansion's geometry: the aspect ratio's range, or a canvas within the
+    size limit on which the placed original is visible and leaves something to expand.
+    """
+    if not _enabled:
+        return
+    if aspect_ratio:
+        ratio = aspect_ratio_value(aspect_ratio)
+        low, high = ASPECT_RATIO_RANGE
+        if not low <= ratio <= high:
+            raise PreflightError(f"Aspect ratio {aspect_ratio} ({ratio:.2f}) is outside {low}-{high}.")
+        return
+
+    canvas_w, canvas_h = _pair(canvas_size, "canvas_size")
+    if max(canvas_w, canvas_h) > MAX_CANVAS_SIDE:
+        raise PreflightError(f"canvas_size {canvas_w}x{canvas_h} exceeds {MAX_CANVAS_SIDE} px per side.")
+    width, height = _pair(original_image_size, "original_image_size")
+    x, y = _pair(original_image_location, "original_image_location", positive=False)
+    if x >= canvas_w or y >= canvas_h or x + width <= 0 or y + height <= 0:
+        raise PreflightError(f"The original image ({width}x{height} at {x},{y}) lies entirely outside "
+                             f"the {canvas_w}x{canvas_h} canvas.")
+    if x <= 0 and y <= 0 and x + width >= canvas_w and y + height >= canvas_h:
+        raise PreflightError(f"The original image ({width}x{height} at {x},{y}) covers the whole "
+                             f"{canvas_w}x{canvas_h} canvas; there is nothing to expand.")
+
+
+async def arun(func, *args, **kwargs):
+    """
+    Run a check that may do network I/O (check_url, check_expandable), or a request
+    builder that calls one, in a worker thread so async callers do not block the loop.
+    """
+    return await asyncio.to_thread(func, *args, **kwargs)
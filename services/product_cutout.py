@@ -1,20 +1,18 @@
-import os
-import requests
-from dotenv import load_dotenv
 
-# Load environment variables from .env..
-load_dotenv()
+from . import http_client, matte_cache, preflight, result_cache
+from .settings import get_settings
 
-API_TOKEN = os.getenv("BRIA_API_KEY")
 BASE_URL = "https://engine.prod.bria-api.com/v1/product/cutout"
 
-def product_cutout(image_url, sku="12345", force_rmbg=False, preserve_alpha=True, content_moderation=False):
-    if not API_TOKEN:
+def _build_cutout_request(image_url, sku="12345", force_rmbg=False, preserve_alpha=True, content_moderation=False):
+    api_token = get_settings().bria_api_key
+    if not api_token:
         raise ValueError("Missing BRIA_API_TOKEN in .env file")
+    preflight.check_url(image_url)
 
     headers = {
         "Content-Type": "application/json",
-        "api_token": API_TOKEN
+        "api_token": api_token
     }
 
     payload = {
@@ -24,9 +22,9 @@ def product_cutout(image_url, sku="12345", force_rmbg=False, preserve_alpha=True
         "preserve_alpha": preserve_alpha,
         "content_moderation": content_moderation
     }
+    return headers, payload
 
-    response = requests.post(BASE_URL, json=payload, headers=headers)
-
+def _read_cutout_response(response):
     if response.status_code == 200:
         result = response.json()
         print("✅ Cutout created successfully!")
@@ -36,3 +34,25 @@ def product_cutout(image_url, sku="12345", force_rmbg=False, preserve_alpha=True
         print(f"❌ Failed with status code {response.status_code}")
         print("🔍 Response:", response.text)
         return None
+
+@result_cache.cached("product_cutout")
+def product_cutout(image_url, sku="12345", force_rmbg=False, preserve_alpha=True, content_moderation=False):
+    cached = None if force_rmbg else matte_cache.reusable_cutout_url(image_url=image_url)
+    if cached:
+        print("✅ Using the cached cutout of this image:", cached)
+        return cached
+
+    headers, payload = _build_cutout_request(image_url, sku, force_rmbg, preserve_alpha, content_moderation)
+    response = http_client.post(BASE_URL, json=payload, headers=headers)
+    result_url = _read_cutout_response(response)
+    # Later tools on the same image can reuse this cutout (see services.matte_cache).
+    matte_cache.remember(matte_cache.source_key(image_url=image_url), result_url, "cutout")
+    return result_url
+
+async def product_cutout_async(image_url, sku="12345", force_rmbg=False, preserve_alpha=True, content_moderation=False):
+    """Async variant of product_cutout. Takes the same arguments and returns the same result."""
+    headers, payload = await preflight.arun(
+        _build_cutout_request, image_url, sku, force_rmbg, preserve_alpha, content_moderation
+    )
+    response = await http_client.apost(BASE_URL, json=payload, headers=headers)
+    return _read_cutout_response(response)
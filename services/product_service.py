@@ -1,20 +1,25 @@
 # services/product_service.py
+import asyncio
 import requests
-import base64
-import io
-import os # Add os import if you're using it here.
+from typing import Optional
+
+from . import history, http_client, matte_cache, preflight, result_cache, upload_optimizer
+from .streaming_body import Base64Field, StreamingJSONBody
 
 BRIA_API_BASE_URL = "https://engine.prod.bria-api.com/v1"
 
-def _call_bria_api(endpoint, api_key, payload):
-    """Helper to make API calls to Bria."""
+def _bria_request(endpoint, api_key):
     headers = {
         'Content-Type': 'application/json',
         'api_token': api_key
     }
-    url = f"{BRIA_API_BASE_URL}{endpoint}"
+    return f"{BRIA_API_BASE_URL}{endpoint}", headers
+
+def _call_bria_api(endpoint, api_key, payload):
+    """Helper to make API calls to Bria."""
+    url, headers = _bria_request(endpoint, api_key)
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        response = http_client.post(url, headers=headers, data=StreamingJSONBody(payload))
         response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
         return response.json()
     except requests.exceptions.HTTPError as http_err:
@@ -24,65 +29,139 @@ def _call_bria_api(endpoint, api_key, payload):
         print(f"Other error occurred: {err}")
         return {"error": f"An unexpected error occurred: {err}"}
 
-def create_product_packshot(
-    api_key: str,
+async def _call_bria_api_async(endpoint, api_key, payload):
+    """Async variant of _call_bria_api with the same error-dict semantics."""
+    url, headers = _bria_request(endpoint, api_key)
+    try:
+        response = await http_client.apost(url, headers=headers, data=StreamingJSONBody(payload))
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.HTTPError as http_err:
+        print(f"HTTP error occurred: {http_err} - {response.text}")
+        return {"error": f"API Error: {response.text}"}
+    except Exception as err:
+        print(f"Other error occurred: {err}")
+        return {"error": f"An unexpected error occurred: {err}"}
+
+def _add_image_source(payload, image_bytes, image_url, endpoint, force_rmbg=False, matte_kinds=matte_cache.KINDS,
+                      original_quality=False, optimize_uploads=None):
+    """
+    Put the image URL or streamed base64 file into the payload. Raises ValueError if neither is given,
+    or a preflight.PreflightError if the API would reject the image or could not download the URL.
+    If a cutout of the image is cached (see services.matte_cache) it is uploaded instead, so the
+    server does not segment the product again; force_rmbg=True always sends the original.
+    original_quality=True keeps the upload at full resolution and optimize_uploads turns the upload
+    optimizer on or off for this call (see upload_optimizer.prepare_upload).
+    """
+    cutout = None if force_rmbg else matte_cache.cutout_for_upload(image_bytes, image_url, matte_kinds)
+    if cutout is not None:
+        upload = upload_optimizer.prepare_upload(cutout, f"/v1{endpoint}", original_quality, optimize_uploads)
+        payload["file"] = Base64Field(upload)
+    elif image_url:
+        preflight.check_url(image_url)
+        payload["image_url"] = image_url
+    elif image_bytes:
+        preflight.check_image(image_bytes)
+        upload = upload_optimizer.prepare_upload(image_bytes, f"/v1{endpoint}", original_quality, optimize_uploads)
+        payload["file"] = Base64Field(upload)
+    else:
+        raise ValueError("Either image_bytes or image_url must be provided.")
+
+def _packshot_payload(
     image_bytes: bytes = None,
     image_url: str = None,
     sku: str = None,
     background_color: str = "#FFFFFF",
     force_rmbg: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
 ):
-    """
-    Calls the Bria API to create a product packshot.
-    Accepts image bytes or a URL.
-    """
     payload = {}
     if sku:
         payload["sku"] = sku
-    if image_url:
-        payload["image_url"] = image_url
-    elif image_bytes:
-        payload["file"] = base64.b64encode(image_bytes).decode('utf-8')
-    else:
-        return {"error": "Either image_bytes or image_url must be provided."}
+    _add_image_source(payload, image_bytes, image_url, "/product/packshot", force_rmbg,
+                      optimize_uploads=optimize_uploads)
 
     payload["background_color"] = background_color
     payload["force_rmbg"] = force_rmbg
     payload["content_moderation"] = content_moderation
+    return payload
 
-    return _call_bria_api("/product/packshot", api_key, payload)
+def _remember_packshot(result, image_bytes, image_url, background_color):
+    if background_color == "transparent" and "result_url" in result:
+        # A transparent packshot can be put on any other colour locally (see services.packshot_recolor).
+        matte_cache.remember(matte_cache.source_key(image_bytes, image_url), result["result_url"], "packshot")
 
-def add_product_shadow(
+@result_cache.cached("create_product_packshot")
+def create_product_packshot(
     api_key: str,
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    background_color: str = "#FFFFFF",
+    force_rmbg: bool = False,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+):
+    """
+    Calls the Bria API to create a product packshot.
+    Accepts image bytes or a URL.
+    """
+    try:
+        payload = _packshot_payload(image_bytes, image_url, sku, background_color, force_rmbg, content_moderation,
+                                    optimize_uploads)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    result = _call_bria_api("/product/packshot", api_key, payload)
+    _remember_packshot(result, image_bytes, image_url, background_color)
+    return result
+
+async def create_product_packshot_async(
+    api_key: str,
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    background_color: str = "#FFFFFF",
+    force_rmbg: bool = False,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+):
+    """Async variant of create_product_packshot. Takes the same arguments and returns the same result."""
+    try:
+        payload = await preflight.arun(_packshot_payload, image_bytes, image_url, sku, background_color,
+                                       force_rmbg, content_moderation, optimize_uploads)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    result = await _call_bria_api_async("/product/packshot", api_key, payload)
+    # Hashing the upload and writing the index stay off the event loop.
+    await asyncio.to_thread(_remember_packshot, result, image_bytes, image_url, background_color)
+    return result
+
+def _shadow_payload(
     image_bytes: bytes = None,
     image_url: str = None,
     sku: str = None,
     shadow_type: str = "regular",
-    background_color: str = None, # None to get transparent background
+    background_color: str = None,
     shadow_color: str = "#000000",
-    shadow_offset: list = None, # [x, y]
+    shadow_offset: list = None,
     shadow_intensity: int = 60,
     shadow_blur: int = None,
     shadow_width: int = None,
     shadow_height: int = 70,
     force_rmbg: bool = False,
     preserve_alpha: bool = True,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
 ):
-    """
-    Calls the Bria API to add shadow to a product cutout.
-    Accepts image bytes or a URL.
-    """
     payload = {}
     if sku:
         payload["sku"] = sku
-    if image_url:
-        payload["image_url"] = image_url
-    elif image_bytes:
-        payload["file"] = base64.b64encode(image_bytes).decode('utf-8')
-    else:
-        return {"error": "Either image_bytes or image_url must be provided."}
+    # Only a cutout: a packshot is re-framed, which would move the shadow off the product's footprint.
+    _add_image_source(payload, image_bytes, image_url, "/product/shadow", force_rmbg,
+                      matte_kinds=("cutout",), optimize_uploads=optimize_uploads)
 
     payload["type"] = shadow_type
     if background_color: # Only include if not None (for transparent)
@@ -99,12 +178,53 @@ def add_product_shadow(
     payload["force_rmbg"] = force_rmbg
     payload["preserve_alpha"] = preserve_alpha
     payload["content_moderation"] = content_moderation
+    return payload
+
+@result_cache.cached("add_product_shadow")
+def add_product_shadow(
+    api_key: str,
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    shadow_type: str = "regular",
+    background_color: str = None, # None to get transparent background
+    shadow_color: str = "#000000",
+    shadow_offset: list = None, # [x, y]
+    shadow_intensity: int = 60,
+    shadow_blur: int = None,
+    shadow_width: int = None,
+    shadow_height: int = 70,
+    force_rmbg: bool = False,
+    preserve_alpha: bool = True,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+):
+    """
+    Calls the Bria API to add shadow to a product cutout.
+    Accepts image bytes or a URL.
+    """
+    try:
+        payload = _shadow_payload(
+            image_bytes, image_url, sku, shadow_type, background_color, shadow_color, shadow_offset,
+            shadow_intensity, shadow_blur, shadow_width, shadow_height, force_rmbg, preserve_alpha,
+            content_moderation, optimize_uploads
+        )
+    except ValueError as e:
+        return {"error": str(e)}
 
     return _call_bria_api("/product/shadow", api_key, payload)
 
+async def add_product_shadow_async(api_key: str, *args, **kwargs):
+    """Async variant of add_product_shadow. Takes the same arguments and returns the same result."""
+    try:
+        payload = await preflight.arun(_shadow_payload, *args, **kwargs)
+    except ValueError as e:
+        return {"error": str(e)}
 
-def create_lifestyle_shot_by_text(
-    api_key: str,
+    return await _call_bria_api_async("/product/shadow", api_key, payload)
+
+
+def _lifestyle_payload(
     scene_description: str,
     image_bytes: bytes = None,
     image_url: str = None,
@@ -116,19 +236,16 @@ def create_lifestyle_shot_by_text(
     exclude_elements: str = None,
     placement_type: str = "original",
     original_quality: bool = False,
-    aspect_ratio: str = None, # e.g., "1:1"
-    shot_size: list = None, # [width, height]
-    foreground_image_size: list = None, # [width, height]
-    foreground_image_location: list = None, # [x, y]
-    manual_placement_selection: list = None, # e.g., ["upper_left"]
-    padding_values: list = None, # [left, right, top, bottom]
+    aspect_ratio: str = None,
+    shot_size: list = None,
+    foreground_image_size: list = None,
+    foreground_image_location: list = None,
+    manual_placement_selection: list = None,
+    padding_values: list = None,
     force_rmbg: bool = False,
-    content_moderation: bool = False
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
 ):
-    """
-    Calls the Bria API to create a lifestyle product shot by text.
-    Accepts image bytes or a URL.
-    """
     payload = {
         "scene_description": scene_description,
         "sync": sync,
@@ -143,12 +260,10 @@ def create_lifestyle_shot_by_text(
 
     if sku:
         payload["sku"] = sku
-    if image_url:
-        payload["image_url"] = image_url
-    elif image_bytes:
-        payload["file"] = base64.b64encode(image_bytes).decode('utf-8')
-    else:
-        return {"error": "Either image_bytes or image_url must be provided."}
+    # Only a cutout in the source's framing: placement is relative to the original photo.
+    _add_image_source(payload, image_bytes, image_url, "/product/lifestyle_shot_by_text", force_rmbg,
+                      matte_kinds=("cutout",), original_quality=original_quality,
+                      optimize_uploads=optimize_uploads)
 
     if exclude_elements:
         payload["exclude_elements"] = exclude_elements
@@ -164,5 +279,54 @@ def create_lifestyle_shot_by_text(
         payload["manual_placement_selection"] = manual_placement_selection
     if padding_values:
         payload["padding_values"] = padding_values
+    return payload
+
+@history.recorded("/v1/product/lifestyle_shot_by_text")
+def create_lifestyle_shot_by_text(
+    api_key: str,
+    scene_description: str,
+    image_bytes: bytes = None,
+    image_url: str = None,
+    sku: str = None,
+    sync: bool = False,
+    fast: bool = True,
+    optimize_description: bool = True,
+    num_results: int = 4,
+    exclude_elements: str = None,
+    placement_type: str = "original",
+    original_quality: bool = False,
+    aspect_ratio: str = None, # e.g., "1:1"
+    shot_size: list = None, # [width, height]
+    foreground_image_size: list = None, # [width, height]
+    foreground_image_location: list = None, # [x, y]
+    manual_placement_selection: list = None, # e.g., ["upper_left"]
+    padding_values: list = None, # [left, right, top, bottom]
+    force_rmbg: bool = False,
+    content_moderation: bool = False,
+    optimize_uploads: Optional[bool] = None
+):
+    """
+    Calls the Bria API to create a lifestyle product shot by text.
+    Accepts image bytes or a URL.
+    """
+    try:
+        payload = _lifestyle_payload(
+            scene_description, image_bytes, image_url, sku, sync, fast, optimize_description, num_results,
+            exclude_elements, placement_type, original_quality, aspect_ratio, shot_size,
+            foreground_image_size, foreground_image_location, manual_placement_selection, padding_values,
+            force_rmbg, content_moderation, optimize_uploads
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+
+    return _call_bria_api("/product/lifestyle_shot_by_text", api_key, payload)
+
+@history.recorded("/v1/product/lifestyle_shot_by_text", like=create_lifestyle_shot_by_text)
+async def create_lifestyle_shot_by_text_async(api_key: str, *args, **kwargs):
+    """Async variant of create_lifestyle_shot_by_text. Takes the same arguments and returns the same result."""
+    try:
+        payload = await preflight.arun(_lifestyle_payload, *args, **kwargs)
+    except ValueError as e:
+        return {"error": str(e)}
 
-    return _call_bria_api("/product/lifestyle_shot_by_text", api_key, payload)
\ No newline at end of file
+    return await _call_bria_api_async("/product/lifestyle_shot_by_text", api_key, payload)
@@ -1,6 +1,65 @@
-from typing import Dict, Any, Optional
-import requests
+from typing import Dict, Any, Optional, Tuple
 import json
+import os
+
+from . import http_client
+from .memo import TTLMemo
+
+# Enhanced prompts are memoized per normalized prompt + kwargs. Set BRIA_PROMPT_CACHE_DB to persist them.
+_prompt_memo = TTLMemo(
+    max_entries=int(os.getenv("BRIA_PROMPT_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("BRIA_PROMPT_CACHE_TTL", str(7 * 24 * 3600))),
+    db_path=os.getenv("BRIA_PROMPT_CACHE_DB")
+)
+
+def configure_prompt_cache(max_entries: int = 2048, ttl_seconds: float = 7 * 24 * 3600, db_path: Optional[str] = None):
+    """
+    Replace the enhance_prompt memo.
+
+    Args:
+        max_entries: Max prompts kept in memory (least recently used are dropped first)
+        ttl_seconds: How long an enhanced prompt stays valid
+        db_path: Optional SQLite file that persists the memo across restarts
+    """
+    global _prompt_memo
+    _prompt_memo = TTLMemo(max_entries=max_entries, ttl_seconds=ttl_seconds, db_path=db_path)
+    return _prompt_memo
+
+def _memo_key(prompt: str, kwargs: Dict[str, Any]) -> str:
+    normalized_prompt = " ".join(prompt.split())
+    return TTLMemo.make_key("enhance_prompt", normalized_prompt, kwargs)
+
+def _build_enhance_prompt_request(
+    api_key: str,
+    prompt: str,
+    **kwargs
+) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+    """Build the (url, headers, data) triple for a prompt enhancement request."""
+    url = "https://engine.prod.bria-api.com/v1/prompt_enhancer"
+
+    headers = {
+        'api_token': api_key,
+        'Accept': 'application/json',
+        'Content-Type': 'application/json'
+    }
+
+    data = {
+        'prompt': prompt,
+        **kwargs
+    }
+    return url, headers, data
+
+def _read_enhance_prompt_response(response, prompt: str, memo_key: str) -> str:
+    response.raise_for_status()
+
+    print(f"Response status: {response.status_code}")
+    print(f"Response body: {response.text}")
+
+    result = response.json()
+    if "prompt variations" in result:
+        # Only real enhancements are memoized, never the original-prompt fallback.
+        _prompt_memo.set(memo_key, result["prompt variations"])
+    return result.get("prompt variations", prompt)  # Return original prompt if enhancement fails
 
 def enhance_prompt(
     api_key: str,
@@ -9,40 +68,53 @@ def enhance_prompt(
 ) -> str:
     """
     Enhance a prompt using Bria AI's prompt enhancement service.
-    
+
+    Repeated prompts (ignoring whitespace differences) with the same kwargs are
+    answered from the memo without a network call.
+
     Args:
         api_key: Bria AI API key
         prompt: Original prompt to enhance
         **kwargs: Additional parameters for the API
-    
+
     Returns:
         Enhanced prompt string
     """
-    url = "https://engine.prod.bria-api.com/v1/prompt_enhancer"
-    
-    headers = {
-        'api_token': api_key,
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
-    
-    data = {
-        'prompt': prompt,
-        **kwargs
-    }
-    
+    memo_key = _memo_key(prompt, kwargs)
+    enhanced = _prompt_memo.get(memo_key)
+    if enhanced is not None:
+        return enhanced
+
+    url, headers, data = _build_enhance_prompt_request(api_key, prompt, **kwargs)
+
     try:
         print(f"Making request to: {url}")
         print(f"Headers: {headers}")
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        print(f"Response status: {response.status_code}")
-        print(f"Response body: {response.text}")
-        
-        result = response.json()
-        return result.get("prompt variations", prompt)  # Return original prompt if enhancement fails
+
+        response = http_client.post(url, headers=headers, json=data)
+        return _read_enhance_prompt_response(response, prompt, memo_key)
+    except Exception as e:
+        print(f"Error enhancing prompt: {str(e)}")
+        return prompt  # Return original prompt on error.
+
+async def enhance_prompt_async(
+    api_key: str,
+    prompt: str,
+    **kwargs
+) -> str:
+    """Async variant of enhance_prompt. Takes the same arguments and returns the same result."""
+    memo_key = _memo_key(prompt, kwargs)
+    enhanced = _prompt_memo.get(memo_key)
+    if enhanced is not None:
+        return enhanced
+
+    url, headers, data = _build_enhance_prompt_request(api_key, prompt, **kwargs)
+
+    try:
+        print(f"Making async request to: {url}")
+
+        response = await http_client.apost(url, headers=headers, json=data)
+        return _read_enhance_prompt_response(response, prompt, memo_key)
     except Exception as e:
         print(f"Error enhancing prompt: {str(e)}")
-        return prompt  # Return original prompt on error.
\ No newline at end of file
+        return prompt  # Return original prompt on error.
@@ -0,0 +1,134 @@
+# services/rate_limit.py
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# Statuses worth another attempt: throttling and transient server-side failures.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+MAX_RETRIES = int(os.getenv("BRIA_MAX_RETRIES", "3"))
+BACKOFF_BASE = float(os.getenv("BRIA_BACKOFF_BASE", "1.0"))  # seconds
+BACKOFF_CAP = float(os.getenv("BRIA_BACKOFF_CAP", "30.0"))  # seconds
+
+# (requests per second, burst size) per Bria endpoint path, matched like http_client.ENDPOINT_TIMEOUTS.
+# Every model version under /text-to-image/hd shares one budget.
+ENDPOINT_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "/v1/text-to-image/hd": (1.0, 5),
+    "/v1/gen_fill": (1.0, 5),
+    "/v1/image_expansion": (1.0, 5),
+    "/v1/background/replace": (1.0, 5),
+    "/v1/background/remove": (2.0, 10),
+    "/v1/background/blur": (2.0, 10),
+    "/v1/erase_foreground": (2.0, 10),
+    "/v1/product/packshot": (2.0, 10),
+    "/v1/product/shadow": (2.0, 10),
+    "/v1/product/lifestyle_shot_by_text": (1.0, 5),
+    "/v1/product/cutout": (2.0, 10),
+    "/v1/product/remove_background": (2.0, 10),
+    "/v1/prompt_enhancer": (5.0, 10),
+}
+DEFAULT_RATE_LIMIT = (2.0, 10)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token and sleep for the returned
+    delay outside the lock, which lets the same bucket serve threads and coroutines.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a queue of callers waiting for future refills.
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float):
+        """Hold every caller of this bucket for `seconds`, e.g. after a 429 from upstream."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def set_rate_limit(endpoint: str, rate: float, burst: Optional[int] = None):
+    """
+    Set the request budget of one endpoint.
+
+    Args:
+        endpoint: Endpoint path prefix, e.g. "/v1/product/packshot".
+        rate: Sustained requests per second.
+        burst: Requests allowed back to back before throttling (default: max(1, rate)).
+    """
+    burst = burst if burst is not None else max(1, int(rate))
+    with _buckets_lock:
+        ENDPOINT_RATE_LIMITS[endpoint] = (rate, burst)
+        _buckets.pop(endpoint, None)
+
+
+def configure_retries(max_retries: Optional[int] = None, backoff_base: Optional[float] = None,
+                      backoff_cap: Optional[float] = None):
+    """Change the retry budget and backoff bounds used for Bria API calls."""
+    global MAX_RETRIES, BACKOFF_BASE, BACKOFF_CAP
+    if max_retries is not None:
+        MAX_RETRIES = max(0, int(max_retries))
+    if backoff_base is not None:
+        BACKOFF_BASE = float(backoff_base)
+    if backoff_cap is not None:
+        BACKOFF_CAP = float(backoff_cap)
+
+
+def bucket_for(endpoint: str) -> TokenBucket:
+    """Return the shared token bucket of an endpoint path prefix."""
+    bucket = _buckets.get(endpoint)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(endpoint)
+            if bucket is None:
+                rate, burst = ENDPOINT_RATE_LIMITS.get(endpoint, DEFAULT_RATE_LIMIT)
+                bucket = _buckets[endpoint] = TokenBucket(rate, burst)
+    return bucket
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+
+    Uses full-jitter exponential backoff, but never less than the server's Retry-After.
+    """
+    server_delay = parse_retry_after(retry_after)
+    if server_delay is not None:
+        return server_delay + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
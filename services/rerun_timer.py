@@ -0,0 +1,43 @@
+# services/rerun_timer.py
+#
+# Wall-clock timing of Streamlit script runs and fragment runs, for comparing full-page
+# reruns with per-tab fragment reruns. Off unless AR_STUDIO_RERUN_LOG names a CSV file;
+# benchmarks/compare_reruns.py summarizes two such logs.
+
+import csv
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_PATH = os.getenv("AR_STUDIO_RERUN_LOG")
+FIELDS = ["timestamp", "mode", "scope", "milliseconds"]
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def measure(scope: str, mode: str):
+    """
+    Time the enclosed block and append (mode, scope, ms) to the rerun log.
+
+    Args:
+        scope: What ran, e.g. "main" or a tab renderer's name
+        mode: "full" for full-page reruns, "fragment" for fragment reruns
+    """
+    if not LOG_PATH:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Also runs when st.rerun() or st.stop() end the script early.
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with _lock:
+            is_new = not os.path.exists(LOG_PATH)
+            with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(FIELDS)
+                writer.writerow([f"{time.time():.3f}", mode, scope, f"{elapsed_ms:.2f}"])
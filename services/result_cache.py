@@ -0,0 +1,287 @@
+# services/result_cache.py
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from . import http_client
+
+# Bump when the key or entry layout changes so stale entries are simply never hit.
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+# Arguments that never change the generated result.
+IGNORED_PARAMS = {"api_key"}
+
+DEFAULT_CACHE_DIR = os.getenv("BRIA_RESULT_CACHE_DIR")
+DEFAULT_MAX_BYTES = int(float(os.getenv("BRIA_RESULT_CACHE_MAX_MB", "1024")) * 1024 * 1024)
+
+
+def hash_stream(data) -> str:
+    """
+    SHA-256 of bytes or a binary file object, read in fixed-size chunks. Seekable
+    file objects are rewound afterwards so the caller can still upload them.
+    """
+    digest = hashlib.sha256()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data).cast("B")
+        for offset in range(0, len(view), HASH_CHUNK_SIZE):
+            digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+    else:
+        start = data.tell() if data.seekable() else None
+        for chunk in iter(lambda: data.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        if start is not None:
+            data.seek(start)
+    return digest.hexdigest()
+
+
+def _normalize(value):
+    if isinstance(value, (bytes, bytearray, memoryview)) or hasattr(value, "read"):
+        return {"sha256": hash_stream(value)}
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(name: str, params: Dict[str, Any]) -> str:
+    """Content address of a call: hash of the function name and its normalized arguments."""
+    normalized = {k: _normalize(v) for k, v in params.items() if k not in IGNORED_PARAMS}
+    blob = json.dumps([CACHE_VERSION, name, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _is_url(value) -> bool:
+    return isinstance(value, str) and value.startswith(("http://", "https://"))
+
+
+def _extension_for(url: str) -> str:
+    ext = os.path.splitext(url.split("?")[0])[1].lower()
+    return ext if ext in (".png", ".jpg", ".jpeg", ".webp", ".webm") else ".png"
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of generation results on disk.
+
+    Each entry lives in <directory>/<key[:2]>/<key>/ with the downloaded result files
+    and an entry.json describing the returned structure. Result URLs are stored as
+    local files and handed back as local paths on a hit; raw bytes results come back
+    as bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def _entries(self):
+        """Yield (last_used, entry_dir, size) for every complete entry."""
+        for fan_out in os.scandir(self.directory):
+            if not fan_out.is_dir():
+                continue
+            for entry in os.scandir(fan_out.path):
+                if entry.name.endswith(".tmp"):
+                    continue  # Another thread is still writing this one.
+                meta_path = os.path.join(entry.path, "entry.json")
+                try:
+                    last_used = os.stat(meta_path).st_mtime
+                except FileNotFoundError:
+                    continue
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                yield last_used, entry.path, size
+
+    def get(self, key: str):
+        """Return the cached result for a key, or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, "entry.json")
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            result = self._restore(meta["result"], entry_dir)
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        os.utime(meta_path)  # Mark as recently used for LRU eviction.
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def put(self, key: str, result) -> bool:
+        """
+        Download every result URL in `result` and store it under `key`.
+        Returns False (and stores nothing) if any download fails.
+        """
+        entry_dir = self._entry_dir(key)
+        staging_dir = f"{entry_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(staging_dir)
+        try:
+            stored = self._store(result, staging_dir, [0])
+            with open(os.path.join(staging_dir, "entry.json"), "w", encoding="utf-8") as f:
+                json.dump({"result": stored}, f)
+            size = sum(e.stat().st_size for e in os.scandir(staging_dir))
+            with self._lock:
+                if os.path.exists(entry_dir):
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    return True
+                os.replace(staging_dir, entry_dir)
+                self._total_bytes += size
+                self._evict()
+            return True
+        except Exception as e:
+            print(f"Result cache: not storing {key[:12]}: {e}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return False
+
+    def _store(self, value, staging_dir, counter):
+        if _is_url(value):
+            filename = f"{counter[0]}{_extension_for(value)}"
+            counter[0] += 1
+            response = http_client.get(value, stream=True)
+            response.raise_for_status()
+            with open(os.path.join(staging_dir, filename), "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            return {"__cached_file__": filename, "as": "path"}
+        if isinstance(value, (bytes, bytearray)):
+            filename = f"{counter[0]}.bin"
+            counter[0] += 1
+            with open(os.path.join(staging_dir, filename), "wb") as f:
+                f.write(value)
+            return {"__cached_file__": filename, "as": "bytes"}
+        if isinstance(value, dict):
+            return {k: self._store(v, staging_dir, counter) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._store(v, staging_dir, counter) for v in value]
+        return value
+
+    def _restore(self, value, entry_dir):
+        if isinstance(value, dict) and "__cached_file__" in value:
+            path = os.path.join(entry_dir, value["__cached_file__"])
+            if value["as"] == "bytes":
+                with open(path, "rb") as f:
+                    return f.read()
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return path
+        if isinstance(value, dict):
+            return {k: self._restore(v, entry_dir) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._restore(v, entry_dir) for v in value]
+        return value
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes. Caller holds the lock."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        for _, entry_dir, size in sorted(self._entries()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            self._total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            for _, entry_dir, _ in list(self._entries()):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes,
+                    "max_bytes": self.max_bytes}
+
+
+_active_cache: Optional[ResultCache] = None
+
+
+def enable(directory: str = ".bria_result_cache", max_bytes: int = DEFAULT_MAX_BYTES) -> ResultCache:
+    """Turn on result caching for every @cached service function."""
+    global _active_cache
+    _active_cache = ResultCache(directory, max_bytes)
+    return _active_cache
+
+
+def disable():
+    global _active_cache
+    _active_cache = None
+
+
+def get_cache() -> Optional[ResultCache]:
+    return _active_cache
+
+
+def _is_cacheable(result) -> bool:
+    if result is None:
+        return False
+    if isinstance(result, dict) and "error" in result:
+        return False
+    return True
+
+
+def cached(name: str, when: Optional[Callable[[Dict[str, Any]], bool]] = None):
+    """
+    Put the result cache in front of a service function. Does nothing unless the
+    cache has been enabled.
+
+    Args:
+        name: Stable name used in the cache key.
+        when: Optional predicate on the bound arguments. Calls for which it returns
+              False (e.g. no fixed seed) bypass the cache.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = _active_cache
+            if cache is None:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            if when is not None and not when(params):
+                return func(*args, **kwargs)
+
+            key = cache_key(name, params)
+            cached_result = cache.get(key)
+            if cached_result is not None:
+                print(f"Result cache hit for {name} ({key[:12]})")
+                return cached_result
+
+            result = func(*args, **kwargs)
+            if _is_cacheable(result):
+                cache.put(key, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def fixed_seed(params: Dict[str, Any]) -> bool:
+    """Cache predicate: the call is reproducible only with a fixed seed and a synchronous result."""
+    return params.get("seed") is not None and params.get("sync", True)
+
+
+if DEFAULT_CACHE_DIR:
+    enable(DEFAULT_CACHE_DIR)
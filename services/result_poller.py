@@ -0,0 +1,150 @@
+# services/result_poller.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional
+
+import requests
+
+from . import http_client
+
+PENDING = "pending"
+READY = "ready"
+EXPIRED = "expired"
+
+# 206 answers the ranged GET sent when HEAD is not allowed.
+READY_STATUSES = (200, 206)
+
+DEFAULT_DEADLINE_SECONDS = 180
+DEFAULT_MAX_WORKERS = 8
+
+
+class UrlState:
+    """Polling state of one async result URL."""
+
+    __slots__ = ("url", "status", "attempts", "started_at", "next_check_at", "interval", "last_http_status")
+
+    def __init__(self, url: str, initial_interval: float):
+        now = time.monotonic()
+        self.url = url
+        self.status = PENDING
+        self.attempts = 0
+        self.started_at = now
+        self.next_check_at = now
+        self.interval = initial_interval
+        self.last_http_status = None
+
+
+class ResultPoller:
+    """
+    Probes pending Bria result URLs concurrently until each one is served.
+
+    Every URL backs off independently (interval multiplied by `backoff` after each
+    miss, capped at `max_interval`) and is marked expired once `deadline_seconds`
+    have passed since it was added.
+    """
+
+    def __init__(self, urls: Iterable[str] = (), deadline_seconds: float = DEFAULT_DEADLINE_SECONDS,
+                 initial_interval: float = 1.0, max_interval: float = 10.0, backoff: float = 1.5,
+                 max_workers: int = DEFAULT_MAX_WORKERS):
+        self.deadline_seconds = deadline_seconds
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.states: Dict[str, UrlState] = {}
+        self.add(urls)
+
+    def add(self, urls: Iterable[str]):
+        for url in urls:
+            if url and url not in self.states:
+                self.states[url] = UrlState(url, self.initial_interval)
+
+    def _with_status(self, status: str) -> List[str]:
+        return [url for url, state in self.states.items() if state.status == status]
+
+    @property
+    def pending(self) -> List[str]:
+        return self._with_status(PENDING)
+
+    @property
+    def ready(self) -> List[str]:
+        return self._with_status(READY)
+
+    @property
+    def expired(self) -> List[str]:
+        return self._with_status(EXPIRED)
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    @staticmethod
+    def _probe(url: str) -> Optional[int]:
+        # HEAD, or a one-byte GET for presigned links that reject HEAD.
+        try:
+            return http_client.probe(url, timeout=(5, 10)).status_code
+        except requests.exceptions.RequestException:
+            return None
+
+    def poll_once(self, on_ready: Optional[Callable[[str], None]] = None, force: bool = False) -> List[str]:
+        """
+        Probe every pending URL that is due (or all of them with `force`) in parallel.
+
+        Args:
+            on_ready: Called with each URL as soon as it is found to be ready.
+            force: Ignore per-URL backoff, e.g. for a manual "check now" button.
+
+        Returns:
+            URLs that became ready during this call.
+        """
+        now = time.monotonic()
+        due = []
+        for state in self.states.values():
+            if state.status != PENDING:
+                continue
+            if now - state.started_at > self.deadline_seconds:
+                state.status = EXPIRED
+            elif force or state.next_check_at <= now:
+                due.append(state)
+        if not due:
+            return []
+
+        newly_ready = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(due))) as executor:
+            futures = {executor.submit(self._probe, state.url): state for state in due}
+            for future in as_completed(futures):
+                state = futures[future]
+                http_status = future.result()
+                state.attempts += 1
+                state.last_http_status = http_status
+                if http_status in READY_STATUSES:
+                    state.status = READY
+                    newly_ready.append(state.url)
+                    if on_ready is not None:
+                        on_ready(state.url)
+                else:
+                    state.next_check_at = time.monotonic() + state.interval
+                    state.interval = min(state.interval * self.backoff, self.max_interval)
+        return newly_ready
+
+    def wait(self, timeout: Optional[float] = None, on_ready: Optional[Callable[[str], None]] = None) -> bool:
+        """
+        Poll until every URL is ready or expired, or until `timeout` seconds pass.
+
+        Returns:
+            True if no URL is pending anymore.
+        """
+        stop_at = time.monotonic() + timeout if timeout is not None else None
+        while not self.done:
+            self.poll_once(on_ready=on_ready)
+            if self.done:
+                break
+            pending_states = [s for s in self.states.values() if s.status == PENDING]
+            next_due = min(min(s.next_check_at for s in pending_states),
+                           min(s.started_at for s in pending_states) + self.deadline_seconds)
+            now = time.monotonic()
+            if stop_at is not None and next_due > stop_at:
+                break
+            time.sleep(max(0.0, next_due - now))
+        return self.done
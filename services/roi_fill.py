@@ -0,0 +1,294 @@
+# services/roi_fill.py
+#
+# Region-of-interest generative fill: instead of uploading the whole photo and a
+# full-frame mask, only the painted region plus some surrounding context is sent. The
+# returned patches are blended back into the full-resolution original with a feathered
+# edge, so touch-ups on large photos upload a fraction of the pixels.
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from . import asset_store, history, mask_ops, preflight
+from .generative_fill import generative_fill
+
+# Context added around the mask bounding box, as a fraction of the box size per side.
+DEFAULT_CONTEXT_MARGIN = 0.5
+# ...but at least this many pixels, and a crop at least this large, so the model sees enough scene.
+MIN_CONTEXT_PX = 64
+MIN_CROP_SIDE = 512
+DEFAULT_FEATHER_PX = 8
+MASK_THRESHOLD = mask_ops.MASK_THRESHOLD
+
+# Concurrent generative_fill calls for independent regions of one image.
+DEFAULT_REGION_WORKERS = 4
+
+BBox = Tuple[int, int, int, int]  # left, top, right, bottom (right/bottom exclusive)
+
+
+def mask_bbox(mask: np.ndarray, threshold: int = MASK_THRESHOLD) -> Optional[BBox]:
+    """Bounding box of mask pixels above `threshold`, or None if the mask is empty."""
+    selected = mask > threshold
+    rows = np.flatnonzero(selected.any(axis=1))
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(selected.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def expand_bbox(bbox: BBox, image_size: Tuple[int, int], margin: float = DEFAULT_CONTEXT_MARGIN,
+                min_context: int = MIN_CONTEXT_PX, min_side: int = MIN_CROP_SIDE) -> BBox:
+    """Grow a box by `margin` of its size (at least `min_context` px) and to `min_side`, within the image."""
+    width, height = image_size
+    left, top, right, bottom = bbox
+
+    def grow(lo, hi, limit):
+        pad = max(int((hi - lo) * margin), min_context)
+        lo, hi = lo - pad, hi + pad
+        short = min(min_side, limit) - (hi - lo)
+        if short > 0:
+            lo, hi = lo - short // 2, hi + short - short // 2
+        # Shift back inside the image rather than shrinking the context.
+        if lo < 0:
+            lo, hi = 0, hi - lo
+        if hi > limit:
+            lo, hi = lo - (hi - limit), limit
+        return max(0, lo), min(limit, hi)
+
+    left, right = grow(left, right, width)
+    top, bottom = grow(top, bottom, height)
+    return left, top, right, bottom
+
+
+def _encode(img: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        img.convert("RGB").save(buffer, format="JPEG", quality=95, subsampling=0)
+    else:
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _result_urls(result: Dict[str, Any]) -> List[str]:
+    if result.get("urls"):
+        return list(result["urls"])
+    if result.get("result_url"):
+        return [result["result_url"]]
+    urls = []
+    for item in result.get("result", []):
+        if isinstance(item, dict):
+            urls.extend(item.get("urls", []))
+        elif isinstance(item, list) and item and isinstance(item[0], str):
+            urls.append(item[0])
+        elif isinstance(item, str):
+            urls.append(item)
+    return urls
+
+
+def feathered_alpha(mask: Image.Image, feather: int) -> Image.Image:
+    """Blend weights for a patch: the mask grown by `feather` px, then blurred by the same radius."""
+    if feather <= 0:
+        return mask
+    return mask_ops.to_image(mask_ops.feather(mask_ops.dilate(mask, feather), feather))
+
+
+def boxes_overlap(a: BBox, b: BBox) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _load_source(image_data) -> Tuple[Image.Image, str]:
+    """Decode the source image; returns (image in RGB or RGBA, format to re-encode it in)."""
+    preflight.check_image(image_data)
+    original = Image.open(preflight.stream(image_data))
+    source_format = "JPEG" if original.format == "JPEG" else "PNG"
+    original.load()
+    return original.convert("RGBA" if original.mode in ("RGBA", "LA", "P") else "RGB"), source_format
+
+
+def _full_resolution_mask(mask_data, image_data) -> Image.Image:
+    # Binarized (by alpha for stroke layers) at full resolution, like plain generative_fill.
+    return mask_ops.to_image(mask_ops.binarize(mask_ops.open_encoded(mask_ops.conform(mask_data, image_data))))
+
+
+def _region_box(mask: Image.Image, image_size: Tuple[int, int], context_margin: float) -> BBox:
+    bbox = mask_bbox(np.asarray(mask))
+    if bbox is None:
+        raise ValueError("The mask is empty; paint the area to fill first.")
+    return expand_bbox(bbox, image_size, margin=context_margin)
+
+
+def _fill_patches(api_key: str, base: Image.Image, mask: Image.Image, roi: BBox, prompt: str,
+                  source_format: str, **kwargs) -> List[Image.Image]:
+    """Upload the `roi` crop of `base` and its mask; return the generated patches at crop size."""
+    crop = base.crop(roi)
+    kwargs["sync"] = True
+    with history.paused():  # The composite is recorded instead of the crop
+        result = generative_fill(api_key, _encode(crop, source_format), _encode(mask.crop(roi), "PNG"), prompt, **kwargs)
+    patch_urls = _result_urls(result or {})
+    if not patch_urls:
+        raise RuntimeError(f"Generative fill returned no results: {result}")
+
+    store = asset_store.get_store()
+    patches = []
+    for url in patch_urls:
+        patch = Image.open(io.BytesIO(store.get_bytes(url))).convert(base.mode)
+        if patch.size != crop.size:
+            patch = patch.resize(crop.size, Image.LANCZOS)
+        patches.append(patch)
+    return patches
+
+
+def _paste_patch(target: Image.Image, patch: Image.Image, alpha: Image.Image, roi: BBox):
+    """Blend `patch` into `target` (in place) over `roi` with the given blend weights."""
+    target.paste(Image.composite(patch, target.crop(roi), alpha), roi[:2])
+
+
+def _save_output(output: Image.Image, source_format: str) -> str:
+    extension = ".jpg" if source_format == "JPEG" and output.mode == "RGB" else ".png"
+    return asset_store.get_store().put(_encode(output, "JPEG" if extension == ".jpg" else "PNG"), extension)
+
+
+@history.recorded("/v1/gen_fill")
+def roi_generative_fill(
+    api_key: str,
+    image_data: bytes,
+    mask_data: bytes,
+    prompt: str,
+    context_margin: float = DEFAULT_CONTEXT_MARGIN,
+    feather: int = DEFAULT_FEATHER_PX,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Generative fill that uploads only the masked region plus context and composites the results locally.
+
+    The mask may be smaller than the image (e.g. drawn on a downscaled canvas); it is
+    scaled to full resolution first. Results are always fetched synchronously since
+    they must be downloaded to be composited.
+
+    Args:
+        api_key: Bria AI API key
+        image_data: Full-resolution image data in bytes
+        mask_data: Mask image data in bytes (white = area to fill)
+        prompt: Description of what to generate in the masked area
+        context_margin: Context around the mask bounding box, as a fraction of its size per side
+        feather: Width in pixels of the soft edge used to blend patches back
+        **kwargs: Further generative_fill arguments (negative_prompt, num_results, seed, ...)
+
+    Returns:
+        Dict with "urls" (local paths of the composited full-resolution images), "roi"
+        (the uploaded box) and "uploaded_fraction" (share of the image's pixels sent)
+    """
+    base, source_format = _load_source(image_data)
+    mask = _full_resolution_mask(mask_data, image_data)
+    roi = _region_box(mask, base.size, context_margin)
+    uploaded_fraction = ((roi[2] - roi[0]) * (roi[3] - roi[1])) / (base.width * base.height)
+    print(f"[roi_fill] Uploading {roi[2] - roi[0]}x{roi[3] - roi[1]} of {base.width}x{base.height} "
+          f"({uploaded_fraction:.0%} of the pixels), region {roi}")
+
+    patches = _fill_patches(api_key, base, mask, roi, prompt, source_format, **kwargs)
+    alpha = feathered_alpha(mask.crop(roi), feather)
+    composited = []
+    for patch in patches:
+        output = base.copy()
+        _paste_patch(output, patch, alpha, roi)
+        composited.append(_save_output(output, source_format))
+
+    return {"urls": composited, "roi": list(roi), "uploaded_fraction": uploaded_fraction}
+
+
+def schedule_regions(boxes: Sequence[BBox]) -> List[int]:
+    """
+    Assign each region to a wave: regions in one wave have disjoint boxes and can run
+    concurrently; a region whose box overlaps an earlier one runs in a later wave than it,
+    so it sees that edit as context. Returns the wave index of each region.
+    """
+    waves = []
+    for index, box in enumerate(boxes):
+        earlier = [waves[j] for j in range(index) if boxes_overlap(box, boxes[j])]
+        waves.append(max(earlier) + 1 if earlier else 0)
+    return waves
+
+
+def _region_args(region) -> Tuple[Any, str, Optional[int]]:
+    if isinstance(region, dict):
+        return region["mask"], region["prompt"], region.get("seed")
+    mask_data, prompt, *rest = region
+    return mask_data, prompt, rest[0] if rest else None
+
+
+@history.recorded("/v1/gen_fill")
+def multi_region_fill(
+    api_key: str,
+    image_data: bytes,
+    regions: Sequence[Any],
+    context_margin: float = DEFAULT_CONTEXT_MARGIN,
+    feather: int = DEFAULT_FEATHER_PX,
+    workers: int = DEFAULT_REGION_WORKERS,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Apply several independent generative fill edits to one image and composite them together.
+
+    Each region is uploaded as its own crop (see roi_generative_fill). Regions whose
+    crops do not overlap are submitted concurrently; a region overlapping an earlier
+    one waits for it and is cropped from the image with that edit already applied.
+    All patches are blended into one full-resolution copy of the source, which is
+    encoded once.
+
+    Args:
+        api_key: Bria AI API key
+        image_data: Full-resolution image data in bytes
+        regions: (mask_data, prompt, seed) tuples or dicts with "mask", "prompt" and
+                 optional "seed" keys; seed may be None
+        context_margin: Context around each mask bounding box, as a fraction of its size per side
+        feather: Width in pixels of the soft edge used to blend patches back
+        workers: Max concurrent generative_fill calls
+        **kwargs: Further generative_fill arguments shared by all regions (negative_prompt,
+                  content_moderation, ...); one result is generated per region
+
+    Returns:
+        Dict with "urls" (local path of the composited image), "regions" (per region:
+        prompt, seed, uploaded box and wave) and "uploaded_fraction" (pixels sent,
+        relative to one full image)
+    """
+    if not regions:
+        raise ValueError("No regions to fill.")
+    base, source_format = _load_source(image_data)
+    kwargs["num_results"] = 1
+    kwargs.pop("seed", None)  # Seeds are per region
+
+    planned = []
+    for mask_data, prompt, seed in map(_region_args, regions):
+        mask = _full_resolution_mask(mask_data, image_data)
+        planned.append((mask, prompt, seed, _region_box(mask, base.size, context_margin)))
+    waves = schedule_regions([roi for _, _, _, roi in planned])
+    uploaded = sum((roi[2] - roi[0]) * (roi[3] - roi[1]) for _, _, _, roi in planned)
+    uploaded_fraction = uploaded / (base.width * base.height)
+    print(f"[roi_fill] {len(planned)} regions in {max(waves) + 1} wave(s), "
+          f"uploading {uploaded_fraction:.0%} of one image's pixels")
+
+    def fill(index):
+        mask, prompt, seed, roi = planned[index]
+        try:
+            return _fill_patches(api_key, base, mask, roi, prompt, source_format, seed=seed, **kwargs)[0]
+        except Exception as e:
+            raise RuntimeError(f"Region {index + 1} ({prompt!r}) failed: {e}") from e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for wave in range(max(waves) + 1):
+            members = [index for index, w in enumerate(waves) if w == wave]
+            # Crops of one wave are all cut from `base` before any of its patches is pasted.
+            patches = list(executor.map(fill, members))
+            for index, patch in zip(members, patches):
+                mask, _, _, roi = planned[index]
+                _paste_patch(base, patch, feathered_alpha(mask.crop(roi), feather), roi)
+
+    return {
+        "urls": [_save_output(base, source_format)],
+        "regions": [{"prompt": prompt, "seed": seed, "roi": list(roi), "wave": wave}
+                    for (_, prompt, seed, roi), wave in zip(planned, waves)],
+        "uploaded_fraction": uploaded_fraction,
+    }
@@ -0,0 +1,45 @@
+# services/settings.py
+
+import os
+import threading
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+class Settings:
+    """Environment configuration for the services, read once after .env has been loaded."""
+
+    def __init__(self):
+        self.bria_api_key: Optional[str] = os.getenv("BRIA_API_KEY")
+
+    def require_api_key(self) -> str:
+        """Return the configured API key or raise ValueError if there is none."""
+        if not self.bria_api_key:
+            raise ValueError("Missing BRIA_API_KEY in .env file.")
+        return self.bria_api_key
+
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """Load .env (once per process) and return the shared Settings."""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                load_dotenv()
+                _settings = Settings()
+                if not _settings.bria_api_key:
+                    print("Warning: BRIA_API_KEY not found. Please set it in your .env file for Bria.ai API calls.")
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """Re-read the environment, e.g. after the key was changed at runtime."""
+    global _settings
+    with _settings_lock:
+        _settings = None
+    return get_settings()
@@ -0,0 +1,91 @@
+# services/shadow_preview.py
+#
+# CPU preview of /product/shadow. Draws the same "regular" (drop) and "float"
+# (elliptical) shadows from the cutout's alpha, taking add_product_shadow's
+# parameters, so shadow settings can be tuned locally and the API is only called for
+# the final render.
+
+from typing import Optional
+
+from PIL import Image
+
+from . import compositing
+
+# add_product_shadow's defaults, used when a parameter is left as None.
+DEFAULT_OFFSET = (0, 15)
+DEFAULT_BLUR = {"regular": 15, "float": 20}
+
+
+def has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _float_shadow(alpha: Image.Image, dx: int, dy: int, width_adjust: float, height: float) -> Image.Image:
+    """
+    An ellipse under the product: centred on the bottom of its bounding box, as wide as
+    the product plus `width_adjust` px and `height` px tall, moved by the offset.
+    """
+    bbox = compositing.alpha_bbox(alpha)
+    if bbox is None or height <= 0:
+        return Image.new("L", alpha.size)
+    left, _, right, bottom = bbox
+    radii = (max(1.0, (right - left + width_adjust) / 2.0), height / 2.0)
+    center = ((left + right) / 2.0 + dx, bottom + dy)
+    return compositing.radial_falloff(alpha.size, center, radii)
+
+
+def render_shadow(
+    cutout: Image.Image,
+    shadow_type: str = "regular",
+    background_color: Optional[str] = None,
+    shadow_color: str = "#000000",
+    shadow_offset: Optional[list] = None,
+    shadow_intensity: int = 60,
+    shadow_blur: Optional[int] = None,
+    shadow_width: Optional[int] = None,
+    shadow_height: int = 70,
+    scale: float = 1.0
+) -> Image.Image:
+    """
+    Render a product cutout with a shadow locally.
+
+    Args:
+        cutout: Product image whose alpha channel separates product from background
+        shadow_type: "regular" (drop shadow) or "float" (elliptical shadow below the product)
+        background_color: Hex background colour, or None for a transparent result
+        shadow_color: Hex shadow colour
+        shadow_offset: [x, y] shadow offset in pixels (default [0, 15])
+        shadow_intensity: Shadow opacity, 0-100
+        shadow_blur: Blur of the shadow's edges in pixels (default 15 regular, 20 float)
+        shadow_width: Float only: width of the ellipse relative to the product, in pixels
+        shadow_height: Float only: height of the ellipse in pixels
+        scale: Size of `cutout` relative to the image the parameters refer to, e.g. 0.25
+               for a preview of a 4x larger image; pixel parameters are scaled by it
+
+    Returns:
+        RGB image, or RGBA when background_color is None
+    """
+    dx, dy = (round(v * scale) for v in (shadow_offset or DEFAULT_OFFSET))
+    blur = DEFAULT_BLUR.get(shadow_type, 15) if shadow_blur is None else shadow_blur
+
+    cutout = cutout.convert("RGBA")
+    alpha = cutout.getchannel("A")
+    if shadow_type == "float":
+        shape = _float_shadow(alpha, dx, dy, (shadow_width or 0) * scale, shadow_height * scale)
+    else:
+        shape = compositing.shift(alpha, dx, dy)
+    shape = compositing.gaussian_blur(shape, blur * scale)
+    shape = compositing.scale_alpha(shape, max(0, min(100, shadow_intensity)) / 100.0)
+
+    result = compositing.over(
+        compositing.background(cutout.size, background_color),
+        compositing.colour_layer(shadow_color, shape),
+        cutout,
+    )
+    return compositing.finish(result, transparent=background_color is None)
+
+
+def preview_shadow(cutout: Image.Image, max_side: int = compositing.PREVIEW_MAX_SIDE, **params) -> Image.Image:
+    """render_shadow on a downscaled copy of `cutout`, with pixel parameters scaled to match."""
+    small, scale = compositing.preview_copy(cutout.convert("RGBA"), max_side)
+    return render_shadow(small, scale=scale, **params)
@@ -0,0 +1,119 @@
+# services/streaming_body.py
+
+import base64
+import io
+import json
+from typing import Any, Dict, Iterator, List, Union
+
+# Raw bytes encoded per chunk. A multiple of 3 so every chunk but the last encodes without padding.
+RAW_CHUNK_SIZE = 3 * 64 * 1024
+
+
+class Base64Field:
+    """
+    A JSON string field whose value is the base64 encoding of `source`, produced
+    chunk by chunk instead of as one big Python string.
+
+    `source` is bytes-like (bytes, bytearray, memoryview) or a seekable binary file
+    object. File objects are read from their current position, which is restored
+    on every pass so the body can be re-sent on retry.
+    """
+
+    def __init__(self, source: Union[bytes, bytearray, memoryview, io.IOBase]):
+        self.source = source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._start = None
+            self.raw_length = memoryview(source).nbytes
+        else:
+            self._start = source.tell()
+            self.raw_length = source.seek(0, io.SEEK_END) - self._start
+            source.seek(self._start)
+
+    def __len__(self) -> int:
+        return 4 * ((self.raw_length + 2) // 3)
+
+    def __repr__(self) -> str:
+        return f"<base64 of {self.raw_length} bytes>"
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._start is None:
+            view = memoryview(self.source).cast("B")
+            for offset in range(0, len(view), RAW_CHUNK_SIZE):
+                yield base64.b64encode(view[offset:offset + RAW_CHUNK_SIZE])
+            return
+
+        self.source.seek(self._start)
+        remaining = self.raw_length
+        carry = b""
+        while remaining > 0:
+            chunk = self.source.read(min(RAW_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            chunk = carry + chunk
+            # read() may return short; only encode whole 3-byte groups until the end.
+            cut = len(chunk) - len(chunk) % 3 if remaining > 0 else len(chunk)
+            carry = chunk[cut:]
+            yield base64.b64encode(chunk[:cut])
+        if carry:
+            yield base64.b64encode(carry)
+
+    def encode(self) -> str:
+        """The whole value as a str, for callers that need an in-memory payload."""
+        return b"".join(self).decode("ascii")
+
+
+class StreamingJSONBody:
+    """
+    A JSON object request body that streams its Base64Field values.
+
+    Pass it as `data=` to http_client.post/apost. It is iterable and sized, so it is
+    sent with a Content-Length header rather than chunked encoding, and a fresh
+    iteration starts on every (re)send. Peak memory is the raw input plus one
+    encoded chunk.
+    """
+
+    def __init__(self, payload: Dict[str, Any]):
+        self.payload = payload
+        self._parts = self._build_parts()
+
+    def _build_parts(self) -> List[Union[bytes, Base64Field]]:
+        parts: List[Union[bytes, Base64Field]] = []
+        pending = bytearray(b"{")
+        for index, (key, value) in enumerate(self.payload.items()):
+            if index:
+                pending += b", "
+            pending += json.dumps(key).encode("utf-8") + b": "
+            if isinstance(value, Base64Field):
+                pending += b'"'
+                parts.append(bytes(pending))
+                parts.append(value)
+                pending = bytearray(b'"')
+            else:
+                pending += json.dumps(value, allow_nan=False).encode("utf-8")
+        pending += b"}"
+        parts.append(bytes(pending))
+        return parts
+
+    def __len__(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self._parts:
+            if isinstance(part, Base64Field):
+                yield from part
+            else:
+                yield part
+
+    async def aiter(self):
+        """Async iterator over the same chunks, for httpx.AsyncClient."""
+        for chunk in self:
+            yield chunk
+
+    def __repr__(self) -> str:
+        return f"StreamingJSONBody({self.payload!r})"
+
+
+def materialize(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of `payload` with every Base64Field encoded to a plain str."""
+    return {k: v.encode() if isinstance(v, Base64Field) else v for k, v in payload.items()}
@@ -0,0 +1,166 @@
+# services/thumbnails.py
+#
+# WebP previews of results for the galleries. When a result arrives, schedule() renders
+# a 1024/512/256 px pyramid on a small thread pool (downloading the result through the
+# asset store first, if needed), the size asked for first; thumbnail() then hands st.image
+# a preview of a few tens of KB instead of the multi-megabyte original, without waiting
+# for previews still being rendered. Downloads keep using the original.
+#
+# Previews are stored in the asset store like any other local file, so its GC evicts
+# them; a small SQLite-backed memo maps each source file to its previews.
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, Optional, Sequence
+
+from PIL import Image
+
+from . import asset_store
+from .memo import TTLMemo
+
+SIZES = (256, 512, 1024)
+WEBP_QUALITY = int(os.getenv("BRIA_THUMBNAIL_QUALITY", "80"))
+# libwebp effort (0-6); 2 is about half the time of the default 4 for a few percent more bytes.
+WEBP_METHOD = 2
+# Recently scheduled sources whose futures are kept, so repeated reruns do not re-check the index.
+MAX_TRACKED = 1024
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("BRIA_THUMBNAIL_WORKERS", "2")),
+                               thread_name_prefix="thumbnails")
+_futures: "OrderedDict[str, Future]" = OrderedDict()
+# Previews finished so far per tracked source, so one can be served before its pyramid is done.
+_finished: Dict[str, Dict[int, str]] = {}
+_futures_lock = threading.Lock()
+_memo: Optional[TTLMemo] = None
+_memo_lock = threading.Lock()
+
+
+def _index() -> TTLMemo:
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                store = asset_store.get_store()
+                _memo = TTLMemo(max_entries=4096, ttl_seconds=store.max_age_seconds,
+                                db_path=os.path.join(store.directory, "thumbnails.sqlite3"))
+    return _memo
+
+
+def _source_key(path: str) -> str:
+    # Store files are content-addressed; the mtime covers files edited in place elsewhere.
+    return f"{os.path.abspath(path)}:{os.stat(path).st_mtime_ns}"
+
+
+def render(path: str, sizes: Sequence[int] = SIZES, first: Optional[int] = None,
+           on_preview: Optional[Callable[[int, str], None]] = None) -> Dict[int, str]:
+    """
+    Write WebP previews of an image file into the asset store.
+
+    Each size is the longest side of its preview (never larger than the original). The
+    image is decoded once; `first` is written before the others, then the rest of the
+    pyramid is built largest first, each level downscaled from the one before it.
+
+    Args:
+        path: Local image file
+        sizes: Longest sides in pixels
+        first: Size needed soonest, e.g. the one on screen
+        on_preview: Called with (size, path) as soon as each preview is written
+
+    Returns:
+        Dict of size -> path of the preview
+    """
+    store = asset_store.get_store()
+    img = Image.open(path)
+    largest = max(sizes)
+    if img.format == "JPEG":
+        img.draft("RGB", (largest, largest))
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    img = img.convert("RGBA" if has_alpha else "RGB")
+
+    previews = {}
+
+    def write(preview, size):
+        buffer = io.BytesIO()
+        preview.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+        previews[size] = store.put(buffer.getvalue(), ".webp")
+        if on_preview is not None:
+            on_preview(size, previews[size])
+
+    if first in sizes and first != largest:
+        preview = img.copy()
+        preview.thumbnail((first, first), Image.LANCZOS)
+        write(preview, first)
+    for size in sorted(sizes, reverse=True):
+        img.thumbnail((size, size), Image.LANCZOS)
+        if size not in previews:
+            write(img, size)
+    return previews
+
+
+def _build(source: str, first: Optional[int]) -> Dict[int, str]:
+    path = asset_store.get_store().get_path(source)
+    key = _source_key(path)
+    known = _index().get(key)
+    if known and all(os.path.isfile(p) for p in known.values()):
+        return {int(size): p for size, p in known.items()}
+
+    def publish(size, preview):
+        with _futures_lock:
+            if source in _finished:
+                _finished[source][size] = preview
+
+    previews = render(path, first=first, on_preview=publish)
+    _index().set(key, {str(size): p for size, p in previews.items()})
+    return previews
+
+
+def schedule(source: str, first: Optional[int] = None) -> Future:
+    """
+    Start rendering the previews of a result (URL or local path) in the background,
+    the `first` size before the others. Cheap to call again: a source already
+    scheduled returns the same future.
+    """
+    with _futures_lock:
+        future = _futures.get(source)
+        if future is not None and not (future.done() and future.exception() is not None):
+            _futures.move_to_end(source)
+            return future
+        _finished[source] = {}
+        future = _executor.submit(_build, source, first)
+        _futures[source] = future
+        while len(_futures) > MAX_TRACKED:
+            dropped, _ = _futures.popitem(last=False)
+            _finished.pop(dropped, None)
+    return future
+
+
+def _pick(previews: Dict[int, str], size: int, fallback: str) -> str:
+    fitting = [s for s in sorted(previews) if s >= size]
+    if fitting:
+        return previews[fitting[0]]
+    return previews[max(previews)] if previews else fallback
+
+
+def thumbnail(source: str, size: int = 512, wait_seconds: float = 0) -> str:
+    """
+    Path of the smallest preview of at least `size` px for a result, for display.
+
+    Schedules the previews if needed, `size` first. Does not block by default: until a
+    preview of at least `size` px is ready (or when none can be made, e.g. for a video)
+    the source itself is returned, and a later rerun picks the preview up. Pass
+    `wait_seconds` to wait that long for it instead.
+    """
+    future = schedule(source, first=size)
+    try:
+        return _pick(future.result(timeout=wait_seconds), size, source)
+    except TimeoutError:
+        with _futures_lock:
+            finished = dict(_finished.get(source, {}))
+        fitting = {s: p for s, p in finished.items() if s >= size}
+        return _pick(fitting, size, source)
+    except Exception as e:
+        print(f"[thumbnails] No preview for {source}: {e}")
+        return source
@@ -0,0 +1,199 @@
+# services/upload_optimizer.py
+#
+# Optional pre-upload stage: studio photos are often 6000 px / 20-40 MB, far above the
+# resolution Bria processes at. When enabled (per call with optimize_uploads=True, or by
+# default for the process with enable() or BRIA_OPTIMIZE_UPLOADS=1),
+# service functions shrink uploads to the resolution the endpoint returns (see
+# ENDPOINT_MAX_SIDE), re-encode them and strip metadata before base64-encoding them
+# into the request.
+
+import io
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from . import preflight
+
+# Longest side (px) worth uploading to each endpoint. Lifestyle shots are generated at about
+# 1 MP (1344 px at 16:9) unless original_quality is requested, so more pixels only cost
+# upload time. The other endpoints return their result at the input's own resolution, so
+# they have no cap (None): their uploads are re-encoded and stripped of metadata only.
+ENDPOINT_MAX_SIDE: Dict[str, Optional[int]] = {
+    "/v1/gen_fill": None,
+    "/v1/product/packshot": None,
+    "/v1/product/shadow": None,
+    "/v1/product/lifestyle_shot_by_text": 1536,
+    "/v1/product/remove_background": None,
+}
+# Cap for endpoints not listed above.
+DEFAULT_MAX_SIDE = int(os.getenv("BRIA_UPLOAD_MAX_SIDE", "2048"))
+
+JPEG_QUALITY = int(os.getenv("BRIA_UPLOAD_JPEG_QUALITY", "90"))
+# Uploads smaller than this are sent untouched unless they exceed the resolution limit.
+MIN_OPTIMIZE_BYTES = 512 * 1024
+
+_enabled = os.getenv("BRIA_OPTIMIZE_UPLOADS", "").lower() in ("1", "true", "yes")
+_stats_lock = threading.Lock()
+_stats = {"uploads": 0, "optimized": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def enable():
+    """
+    Optimize uploads by default in this process, for calls that do not pass optimize_uploads.
+    Affects every user of a shared server; the app passes its per-session setting instead.
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_max_side(endpoint: str, max_side: Optional[int]):
+    """Change the cap for an endpoint, e.g. set_max_side("/v1/gen_fill", 1024); None removes it."""
+    ENDPOINT_MAX_SIDE[endpoint] = int(max_side) if max_side is not None else None
+
+
+def stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats, bytes_saved=_stats["bytes_in"] - _stats["bytes_out"])
+
+
+def _target_size(size: Tuple[int, int], max_side: Optional[int]) -> Tuple[int, int]:
+    width, height = size
+    if max_side is None:
+        return size
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _has_alpha(img) -> bool:
+    return img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _encode(img, keep_alpha: bool) -> bytes:
+    buffer = io.BytesIO()
+    if keep_alpha:
+        # Cutouts need their alpha channel; PNG keeps it lossless.
+        img.convert("RGBA").save(buffer, format="PNG", optimize=True)
+    else:
+        # 4:4:4 chroma keeps product edges crisp for background removal.
+        img.convert("RGB").save(buffer, format="JPEG", quality=JPEG_QUALITY, subsampling=0, optimize=True)
+    return buffer.getvalue()
+
+
+def _report(label: str, original_size, size, bytes_in: int, bytes_out: int, optimized: bool):
+    with _stats_lock:
+        _stats["uploads"] += 1
+        _stats["bytes_in"] += bytes_in
+        _stats["bytes_out"] += bytes_out
+        _stats["optimized"] += int(optimized)
+    if optimized:
+        saved = bytes_in - bytes_out
+        print(f"[upload_optimizer] {label}: {original_size[0]}x{original_size[1]} {bytes_in / 1e6:.1f} MB -> "
+              f"{size[0]}x{size[1]} {bytes_out / 1e6:.1f} MB (saved {saved / 1e6:.1f} MB, {100 * saved / bytes_in:.0f}%)")
+
+
+def optimize_image(data, max_side: Optional[int] = DEFAULT_MAX_SIDE, label: str = "upload", apply_orientation: bool = True):
+    """
+    Downscale an encoded image to at most `max_side` px on its long side and re-encode it.
+
+    JPEGs are decoded with Image.draft, so the decoder itself skips pixels (DCT scaling)
+    instead of decoding all 6000 px and resizing afterwards. EXIF orientation is applied
+    before metadata is dropped so the upload is not rotated, unless `apply_orientation`
+    is False (the pixel grid must stay aligned with a mask drawn on the raw image).
+
+    Args:
+        data: Encoded image as bytes-like or a seekable binary file object
+        max_side: Longest side of the result in pixels; None keeps the size and only re-encodes
+        label: Name used in the savings report
+        apply_orientation: Rotate according to the EXIF orientation tag
+
+    Returns:
+        Tuple of (data, size). `data` is the original object when re-encoding would not
+        make it smaller; otherwise new bytes.
+    """
+    # PIL is only imported once optimization is actually used.
+    from PIL import Image, ImageOps
+
+    source = preflight.stream(data)  # Read in place, not copied
+    bytes_in = source.seek(0, io.SEEK_END)
+    source.seek(0)
+    try:
+        img = Image.open(source)
+        original_size = img.size
+        target = _target_size(original_size, max_side)
+        if target == original_size and bytes_in < MIN_OPTIMIZE_BYTES:
+            _report(label, original_size, original_size, bytes_in, bytes_in, False)
+            return data, original_size
+
+        if img.format == "JPEG":
+            img.draft("RGB", target)
+        if apply_orientation:
+            img = ImageOps.exif_transpose(img)
+        target = _target_size(img.size, max_side)
+        if img.size != target:
+            img = img.resize(target, Image.LANCZOS)
+        optimized = _encode(img, keep_alpha=_has_alpha(img))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        print(f"[upload_optimizer] {label}: sending original, could not optimize ({e})")
+        return data, None
+
+    if len(optimized) >= bytes_in and img.size == original_size:
+        _report(label, original_size, original_size, bytes_in, bytes_in, False)
+        return data, original_size
+    _report(label, original_size, img.size, bytes_in, len(optimized), True)
+    return optimized, img.size
+
+
+def _max_side(endpoint: str, original_quality: bool) -> Optional[int]:
+    return None if original_quality else ENDPOINT_MAX_SIDE.get(endpoint, DEFAULT_MAX_SIDE)
+
+
+def _wanted(enabled: Optional[bool]) -> bool:
+    return _enabled if enabled is None else enabled
+
+
+def prepare_upload(data, endpoint: str, original_quality: bool = False, enabled: Optional[bool] = None):
+    """
+    Optimize `data` for `endpoint` if optimization is enabled, otherwise return it unchanged.
+    With `original_quality` (the caller wants a result at the input's resolution) the
+    image is never downscaled. `enabled` overrides the process default for this call.
+    """
+    if not _wanted(enabled) or data is None:
+        return data
+    return optimize_image(data, max_side=_max_side(endpoint, original_quality), label=endpoint)[0]
+
+
+def prepare_image_and_mask(image_data, mask_data, endpoint: str, enabled: Optional[bool] = None):
+    """
+    Like prepare_upload for an image and its mask. The mask is resized to exactly the
+    optimized image's size (nearest neighbour, so it stays binary) because the API
+    requires both to match.
+    """
+    if not _wanted(enabled):
+        return image_data, mask_data
+    optimized, size = optimize_image(image_data, max_side=_max_side(endpoint, False), label=endpoint,
+                                     apply_orientation=False)
+    if optimized is image_data or size is None:
+        return image_data, mask_data
+
+    from PIL import Image
+
+    try:
+        mask = Image.open(preflight.stream(mask_data))
+        if mask.size == size:
+            return optimized, mask_data
+        mask = mask.convert("L").resize(size, Image.NEAREST)
+        buffer = io.BytesIO()
+        mask.save(buffer, format="PNG", optimize=True)
+    except (OSError, ValueError) as e:
+        print(f"[upload_optimizer] {endpoint}: sending originals, could not resize mask ({e})")
+        return image_data, mask_data
+    return optimized, buffer.getvalue()